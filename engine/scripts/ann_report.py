@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+ANN Recall vs Latency Report
+
+Benchmarks IVF-Flat / HNSW / IVF-PQ against the exact flat baseline on the
+library's own vectors, so FAISS_INDEX_TYPE / FAISS_NPROBE / FAISS_EF_SEARCH
+can be picked with evidence.
+
+Queries are stored vectors with small gaussian noise (re-normalized), so
+they behave like unseen queries near real content. Ground truth = exact
+IndexFlatIP top-k. Latency = single-query search (how MCP calls search).
+
+Usage:
+    python ann_report.py                      # /app/books/faiss.index
+    python ann_report.py --index path --queries 500 --k 10
+    python ann_report.py --out ann-report.json
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import List, Dict
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+from ann_index import build_index, read_vectors, search_params
+
+FAISS_INDEX_PATH = Path("/app/books/faiss.index")
+
+# Parameter sweeps per index type
+SWEEPS = {
+    "ivf": ("nprobe", [1, 4, 8, 16, 32, 64]),
+    "hnsw": ("efSearch", [16, 32, 64, 128, 256]),
+    "ivfpq": ("nprobe", [1, 4, 8, 16, 32, 64]),
+}
+
+
+def make_queries(vectors: np.ndarray, n: int, noise: float, seed: int = 0) -> np.ndarray:
+    """Sample stored vectors, perturb, re-normalize."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), min(n, len(vectors)), replace=False)
+    queries = vectors[rows] + rng.normal(0, noise, (len(rows), vectors.shape[1])).astype("float32")
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def timed_search(index: faiss.Index, queries: np.ndarray, k: int, params) -> tuple:
+    """One search call per query; returns (ids, mean ms, p95 ms)."""
+    ids = np.empty((len(queries), k), dtype="int64")
+    latencies = []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, row_ids = index.search(queries[i:i + 1], k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids[i] = row_ids[0]
+    return ids, float(np.mean(latencies)), float(np.percentile(latencies, 95))
+
+
+def recall_at_k(approx: np.ndarray, exact: np.ndarray) -> float:
+    """Mean |approx ∩ exact| / k over queries."""
+    k = exact.shape[1]
+    hits = [len(set(a[a >= 0]) & set(e[e >= 0])) for a, e in zip(approx, exact)]
+    return float(np.mean(hits) / k)
+
+
+def run_report(vectors: np.ndarray, n_queries: int, k: int, noise: float) -> List[Dict]:
+    """Build each index type and sweep its search parameter."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    faiss.normalize_L2(vectors)
+    queries = make_queries(vectors, n_queries, noise)
+
+    rows = []
+
+    # Baseline
+    start = time.perf_counter()
+    flat = build_index("flat", vectors)
+    build_s = time.perf_counter() - start
+    exact, mean_ms, p95_ms = timed_search(flat, queries, k, None)
+    rows.append({
+        "index": "flat", "param": "-", "value": None, "recall": 1.0,
+        "mean_ms": mean_ms, "p95_ms": p95_ms, "build_s": build_s,
+        "size_mb": faiss.serialize_index(flat).nbytes / 1024 / 1024
+    })
+    print(f"   flat: {mean_ms:.2f} ms/query (baseline)")
+
+    for kind, (param_name, values) in SWEEPS.items():
+        start = time.perf_counter()
+        index = build_index(kind, vectors)
+        build_s = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1024 / 1024
+        print(f"   {kind}: built in {build_s:.1f}s ({size_mb:.1f} MB)")
+
+        for value in values:
+            params = search_params(
+                index,
+                nprobe=value if param_name == "nprobe" else None,
+                ef_search=value if param_name == "efSearch" else None
+            )
+            ids, mean_ms, p95_ms = timed_search(index, queries, k, params)
+            rows.append({
+                "index": kind, "param": param_name, "value": value,
+                "recall": recall_at_k(ids, exact),
+                "mean_ms": mean_ms, "p95_ms": p95_ms, "build_s": build_s,
+                "size_mb": size_mb
+            })
+
+    return rows
+
+
+def format_report(rows: List[Dict], n_vectors: int, n_queries: int, k: int) -> str:
+    """Markdown table (same register as the README performance table)."""
+    baseline_ms = rows[0]["mean_ms"]
+    lines = [
+        f"## ANN recall vs latency ({n_vectors:,} vectors, {n_queries} queries, recall@{k})",
+        "",
+        "| Index | Param | Recall | Mean ms | p95 ms | Speedup | Size MB | Build s |",
+        "|-------|-------|--------|---------|--------|---------|---------|---------|",
+    ]
+    for r in rows:
+        param = f"{r['param']}={r['value']}" if r["value"] is not None else "-"
+        speedup = baseline_ms / r["mean_ms"] if r["mean_ms"] else 0
+        lines.append(
+            f"| {r['index']} | {param} | {r['recall']:.3f} | {r['mean_ms']:.2f} | "
+            f"{r['p95_ms']:.2f} | {speedup:.1f}x | {r['size_mb']:.1f} | {r['build_s']:.1f} |"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="ANN recall vs latency report")
+    parser.add_argument('--index', type=str, default=str(FAISS_INDEX_PATH), help="FAISS index to sample vectors from")
+    parser.add_argument('--queries', type=int, default=200, help="Number of queries")
+    parser.add_argument('--k', type=int, default=10, help="Recall@k")
+    parser.add_argument('--noise', type=float, default=0.05, help="Query perturbation (stddev)")
+    parser.add_argument('--out', type=str, help="Also write rows as JSON")
+
+    args = parser.parse_args()
+
+    index_path = Path(args.index)
+    if not index_path.exists():
+        print(f"❌ FAISS index not found: {index_path}")
+        return 1
+
+    print(f"\n📏 Loading vectors from {index_path}...")
+    vectors = read_vectors(faiss.read_index(str(index_path)))
+    print(f"   {len(vectors):,} vectors, {vectors.shape[1]} dims\n")
+
+    if len(vectors) < args.k:
+        print(f"❌ Need at least k={args.k} vectors")
+        return 1
+
+    rows = run_report(vectors, args.queries, args.k, args.noise)
+
+    print()
+    print(format_report(rows, len(vectors), min(args.queries, len(vectors)), args.k))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n✅ Wrote {args.out}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Chunk Store — compact on-disk chunk metadata (replaces metadata.json)
+
+Layout (one directory):
+    manifest.json      committed segments + book table + tombstones
+    seg-000001.dat     concatenated chunk records (compact JSON, utf-8)
+    seg-000001.idx     offsets table: little-endian uint64, rows + 1 entries
+    seg-000001.ids     chunk_id per row (newline-separated) → chunk_id lookup
+    seg-000001.vec     normalized float32 vectors per row, until the FAISS
+                       index covers them (see drop_vectors)
+    seg-000002.dat     ...one segment per indexer checkpoint
+
+Row i of the store (segments in manifest order) = row i of the FAISS index.
+
+Key properties:
+- Append-only: each checkpoint writes one new segment, old segments are
+  never touched (compaction merges them back into one)
+- manifest.json is the commit point (an uncommitted segment is ignored
+  and overwritten by the next run)
+- A segment's .vec file lets the indexer write the FAISS index once per
+  run (or rebuild its tail after a crash) instead of at every checkpoint
+- Readers mmap segments and decode only the rows they return
+- chunk_id → row is a hash lookup (built from .ids files, no record decoding)
+- Deleted books become tombstoned row ranges until compaction rewrites the store
+
+Usage:
+    store = ChunkStore("/app/books/chunks")
+    store.append(new_chunks, books)
+    chunk = store.get(42)
+"""
+import os
+import json
+import mmap
+import bisect
+import tempfile
+from pathlib import Path
+from typing import List, Dict, Optional, Iterator, Iterable
+
+import numpy as np
+
+OFFSET_DTYPE = np.dtype("<u8")
+VECTOR_DTYPE = np.dtype("<f4")
+MANIFEST_VERSION = 1
+
+
+class ChunkStore:
+    """
+    Segmented record store, opened with mmap for reading.
+
+    Writers: append(), write_books(), replace_all(), drop_vectors()
+             (stage_segment() + commit_replacement() for multi-file commits)
+    Readers: len(), get(), get_by_id(), get_many_by_id(), iter_chunks(), books(),
+             tombstones(), dead_mask(), read_vectors()
+    """
+
+    def __init__(self, path: str, max_rows: Optional[int] = None):
+        """
+        Args:
+            path: Store directory (created on first write)
+            max_rows: Read-only view of the first max_rows committed rows
+                      (a searcher whose FAISS index is behind the store)
+        """
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self.manifest_path = self.path / "manifest.json"
+
+        self._manifest = None   # committed manifest snapshot
+        self._segments = None   # [(offsets, mmap)] per segment
+        self._starts = None     # first global row of each segment
+        self._rows_by_id = None # chunk_id → global row
+        self._rows = None       # committed row count
+
+    # ------------------------------------------------------------------
+    # Manifest
+    # ------------------------------------------------------------------
+
+    def exists(self) -> bool:
+        return self.manifest_path.exists() or (self.path / "chunks.idx").exists()
+
+    def _load_manifest(self) -> Dict:
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as f:
+                return json.load(f)
+
+        # Pre-segment layout (single chunks.dat/chunks.idx + books.json)
+        if (self.path / "chunks.idx").exists():
+            books_path = self.path / "books.json"
+            books = []
+            if books_path.exists():
+                with open(books_path) as f:
+                    books = json.load(f)
+            rows = len(self._read_offsets("chunks")) - 1
+            return {
+                "version": MANIFEST_VERSION,
+                "segments": [{"name": "chunks", "rows": rows}],
+                "books": books
+            }
+
+        return {"version": MANIFEST_VERSION, "segments": [], "books": []}
+
+    def _commit_manifest(self, manifest: Dict):
+        """Atomically publish a new manifest (the commit point)."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        temp = tempfile.NamedTemporaryFile("w", delete=False, dir=self.path)
+        json.dump(manifest, temp)
+        temp.flush()
+        os.fsync(temp.fileno())
+        temp.close()
+        os.replace(temp.name, self.manifest_path)
+
+        # Cached read mapping is stale now
+        self.close()
+
+    def manifest(self) -> Dict:
+        if self._manifest is None:
+            manifest = self._load_manifest()
+            if self.max_rows is not None:
+                manifest = truncate_manifest(manifest, self.max_rows)
+            self._manifest = manifest
+        return self._manifest
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def _read_offsets(self, name: str) -> np.ndarray:
+        """Offsets of one segment (whole uint64 entries only, always >= 1 entry)."""
+        index_path = self.path / f"{name}.idx"
+        if not index_path.exists():
+            return np.zeros(1, dtype=OFFSET_DTYPE)
+        raw = index_path.read_bytes()
+        whole = len(raw) - len(raw) % OFFSET_DTYPE.itemsize
+        offsets = np.frombuffer(raw[:whole], dtype=OFFSET_DTYPE)
+        return offsets if len(offsets) else np.zeros(1, dtype=OFFSET_DTYPE)
+
+    def open(self):
+        """
+        Map committed segments (snapshot of the manifest).
+
+        Called lazily by the first read. Long-lived readers call it up front:
+        once mapped, segment files stay readable even after compaction
+        unlinks them.
+        """
+        if self._segments is not None:
+            return
+
+        segments = []
+        starts = []
+        row = 0
+        for seg in self.manifest()["segments"]:
+            # Only the rows the manifest committed are visible
+            offsets = self._read_offsets(seg["name"])[:seg["rows"] + 1]
+            if offsets[-1] == 0:
+                data = b""
+            else:
+                with open(self.path / f"{seg['name']}.dat", "rb") as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            segments.append((offsets, data))
+            starts.append(row)
+            row += seg["rows"]
+
+        self._segments = segments
+        self._starts = starts
+
+    def close(self):
+        for _, data in self._segments or []:
+            if isinstance(data, mmap.mmap):
+                data.close()
+        self._manifest = None
+        self._segments = None
+        self._starts = None
+        self._rows_by_id = None
+        self._rows = None
+
+    def __len__(self) -> int:
+        if self._rows is None:
+            self._rows = sum(seg["rows"] for seg in self.manifest()["segments"])
+        return self._rows
+
+    def get(self, row: int) -> Dict:
+        """Decode one chunk record by global row number."""
+        self.open()
+        if row < 0 or row >= len(self):
+            raise IndexError(f"Chunk row out of range: {row}")
+        seg_idx = bisect.bisect_right(self._starts, row) - 1
+        offsets, data = self._segments[seg_idx]
+        local = row - self._starts[seg_idx]
+        start, end = int(offsets[local]), int(offsets[local + 1])
+        return json.loads(data[start:end])
+
+    def _segment_ids(self, seg: Dict, start: int) -> List[str]:
+        """chunk_ids of one segment (decodes rows only for pre-.ids segments)."""
+        ids_path = self.path / f"{seg['name']}.ids"
+        if ids_path.exists():
+            ids = ids_path.read_text().split("\n")[:seg["rows"]]
+            if len(ids) == seg["rows"]:
+                return ids
+        return [self.get(row).get("chunk_id", "") for row in range(start, start + seg["rows"])]
+
+    def build_id_index(self):
+        """Build the chunk_id → row hash map (once per snapshot)."""
+        if self._rows_by_id is not None:
+            return
+        rows_by_id = {}
+        row = 0
+        for seg in self.manifest()["segments"]:
+            for offset, chunk_id in enumerate(self._segment_ids(seg, row)):
+                rows_by_id[chunk_id] = row + offset
+            row += seg["rows"]
+        self._rows_by_id = rows_by_id
+
+    def row_of(self, chunk_id: str) -> Optional[int]:
+        """Global row of a chunk_id (O(1) hash lookup)."""
+        self.build_id_index()
+        return self._rows_by_id.get(chunk_id)
+
+    def get_by_id(self, chunk_id: str) -> Optional[Dict]:
+        """Decode one chunk record by chunk_id (None if unknown)."""
+        row = self.row_of(chunk_id)
+        return None if row is None else self.get(row)
+
+    def get_many_by_id(self, chunk_ids: List[str]) -> List[Optional[Dict]]:
+        """Batch get_by_id (result aligned with chunk_ids, None if unknown)."""
+        return [self.get_by_id(chunk_id) for chunk_id in chunk_ids]
+
+    def iter_chunks(self, start: int = 0) -> Iterator[Dict]:
+        """Decode rows sequentially (for migrations / full scans)."""
+        for row in range(start, len(self)):
+            yield self.get(row)
+
+    def books(self) -> List[Dict]:
+        """Book table (committed with the last segment)."""
+        return self.manifest().get("books", [])
+
+    def tombstones(self) -> List[List[int]]:
+        """Dead row ranges [start, end) (vectors of deleted books)."""
+        return self.manifest().get("tombstones", [])
+
+    def dead_mask(self) -> Optional[np.ndarray]:
+        """Boolean mask over rows (True = tombstoned), None if nothing is dead."""
+        tombstones = self.tombstones()
+        if not tombstones:
+            return None
+        mask = np.zeros(len(self), dtype=bool)
+        for start, end in tombstones:
+            mask[start:end] = True
+        return mask
+
+    def read_vectors(self, start: int, end: int) -> np.ndarray:
+        """
+        Vectors of rows [start, end) from the segments' .vec files.
+
+        Raises:
+            FileNotFoundError: a segment in the range has no .vec file
+                (its vectors only live in the FAISS index)
+        """
+        parts = []
+        row = 0
+        for seg in self.manifest()["segments"]:
+            seg_start, seg_end = row, row + seg["rows"]
+            row = seg_end
+            if seg_end <= start or seg_start >= end or seg["rows"] == 0:
+                continue
+            vectors = np.fromfile(self.path / f"{seg['name']}.vec", dtype=VECTOR_DTYPE)
+            vectors = vectors.reshape(seg["rows"], -1)
+            parts.append(vectors[max(start, seg_start) - seg_start:min(end, seg_end) - seg_start])
+        return np.vstack(parts) if parts else np.empty((0, 0), dtype=VECTOR_DTYPE)
+
+    def drop_vectors(self):
+        """Remove every .vec file (the FAISS index on disk covers all rows)."""
+        for path in self.path.glob("*.vec"):
+            path.unlink(missing_ok=True)
+
+    def size_bytes(self) -> int:
+        """Total on-disk size of committed segments + manifest."""
+        paths = [self.manifest_path]
+        for seg in self.manifest()["segments"]:
+            paths += [self.path / f"{seg['name']}{ext}" for ext in (".dat", ".idx", ".ids", ".vec")]
+        return sum(p.stat().st_size for p in paths if p.exists())
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def _next_segment_name(self, manifest: Dict) -> str:
+        numbers = [
+            int(seg["name"].split("-")[1])
+            for seg in manifest["segments"]
+            if seg["name"].startswith("seg-")
+        ]
+        return f"seg-{max(numbers, default=0) + 1:06d}"
+
+    def _write_segment(self, name: str, chunks: Iterable[Dict], vectors: Optional[np.ndarray] = None) -> int:
+        """Write + fsync one segment. Not visible until the manifest commits it."""
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        offsets = [0]
+        chunk_ids = []
+
+        # "wb" also overwrites a segment left behind by a crashed run
+        with open(self.path / f"{name}.dat", "wb") as f:
+            for chunk in chunks:
+                record = encode_record(chunk)
+                f.write(record)
+                offsets.append(offsets[-1] + len(record))
+                chunk_ids.append(chunk.get("chunk_id", ""))
+            f.flush()
+            os.fsync(f.fileno())
+
+        with open(self.path / f"{name}.idx", "wb") as f:
+            f.write(np.array(offsets, dtype=OFFSET_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        with open(self.path / f"{name}.ids", "w") as f:
+            f.write("\n".join(chunk_ids))
+            f.flush()
+            os.fsync(f.fileno())
+
+        vector_path = self.path / f"{name}.vec"
+        if vectors is None:
+            vector_path.unlink(missing_ok=True)
+        else:
+            if len(vectors) != len(chunk_ids):
+                raise ValueError(f"{len(vectors)} vectors for {len(chunk_ids)} chunks")
+            with open(vector_path, "wb") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=VECTOR_DTYPE).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        return len(chunk_ids)
+
+    def append(
+        self,
+        chunks: List[Dict],
+        books: Optional[List[Dict]] = None,
+        tombstones: Optional[List[List[int]]] = None,
+        vectors: Optional[np.ndarray] = None
+    ):
+        """
+        Append chunk records as a new segment (O(new chunks)).
+
+        Args:
+            chunks: New chunk records (row order = FAISS order)
+            books: Book table to commit with them (None = keep current)
+            tombstones: Row ranges [start, end) to mark dead (added to existing)
+            vectors: Normalized vectors of `chunks`, kept in the segment's
+                     .vec file until drop_vectors()
+        """
+        manifest = self._load_manifest()
+
+        if chunks:
+            name = self._next_segment_name(manifest)
+            rows = self._write_segment(name, chunks, vectors)
+            manifest["segments"].append({"name": name, "rows": rows})
+
+        if books is not None:
+            manifest["books"] = books
+
+        if tombstones:
+            manifest["tombstones"] = manifest.get("tombstones", []) + [list(t) for t in tombstones]
+
+        if chunks or books is not None or tombstones:
+            self._commit_manifest(manifest)
+
+    def write_books(self, books: List[Dict], tombstones: Optional[List[List[int]]] = None):
+        """Commit a new book table (and tombstones), no chunk changes."""
+        self.append([], books, tombstones)
+
+    def replace_all(self, chunks: Iterable[Dict], books: List[Dict]):
+        """
+        Rewrite the whole store as a single segment (full rebuilds).
+
+        Old segment files are removed after the new manifest commits: readers
+        that already mapped them (see open()) keep reading the old files until
+        they close, readers that did not must be reopened. Tombstones are
+        cleared (dead rows are simply not in `chunks`).
+        """
+        old = self._load_manifest()
+        segment = self.stage_segment(chunks)
+        self.commit_replacement(segment, books, [seg["name"] for seg in old["segments"]])
+
+    def stage_segment(self, chunks: Iterable[Dict]) -> Dict:
+        """
+        Write a replacement segment without committing it (see commit_replacement).
+
+        Returns:
+            {"name": ..., "rows": ...} segment entry
+        """
+        name = self._next_segment_name(self._load_manifest())
+        rows = self._write_segment(name, chunks)
+        return {"name": name, "rows": rows}
+
+    def commit_replacement(self, segment: Dict, books: List[Dict], old_segments: List[str]):
+        """
+        Commit `segment` as the only segment, then remove `old_segments`.
+
+        Idempotent: committing the same replacement twice (e.g. when an
+        interrupted compaction is finished) is harmless.
+        """
+        self._commit_manifest({
+            "version": MANIFEST_VERSION,
+            "segments": [segment],
+            "books": books,
+            "tombstones": []
+        })
+
+        for name in old_segments:
+            if name == segment["name"]:
+                continue
+            for ext in (".dat", ".idx", ".ids", ".vec"):
+                (self.path / f"{name}{ext}").unlink(missing_ok=True)
+        (self.path / "books.json").unlink(missing_ok=True)
+
+def truncate_manifest(manifest: Dict, max_rows: int) -> Dict:
+    """Manifest restricted to its first max_rows rows (segments and tombstones cut)."""
+    segments = []
+    row = 0
+    for seg in manifest["segments"]:
+        if row >= max_rows:
+            break
+        rows = min(seg["rows"], max_rows - row)
+        segments.append({**seg, "rows": rows})
+        row += rows
+
+    tombstones = [
+        [start, min(end, max_rows)]
+        for start, end in manifest.get("tombstones", [])
+        if start < max_rows
+    ]
+    return {**manifest, "segments": segments, "tombstones": tombstones}
+
+
+def encode_record(chunk: Dict) -> bytes:
+    """Compact JSON record (embeddings never go in the records, see .vec files)."""
+    record = {k: v for k, v in chunk.items() if k != "embedding"}
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def migrate_metadata_json(metadata_path: Path, store: ChunkStore) -> bool:
+    """
+    One-time import of a legacy metadata.json into an empty store.
+
+    Returns:
+        True if a migration happened
+    """
+    if store.exists() or not Path(metadata_path).exists():
+        return False
+
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+
+    store.replace_all(metadata.get("chunks", []), metadata.get("books", []))
+    return True
@@ -208,9 +208,12 @@ def cluster_discipline(discipline_id: str, discipline_path: Path):
     index['clusters'] = clusters
     index['last_clustered'] = time.time()
     
+    # Atomic replace: the MCP server hot-reloads this file
     index_path = discipline_path / ".discipline-index.json"
-    with open(index_path, 'w') as f:
+    tmp_path = index_path.with_suffix(".json.tmp")
+    with open(tmp_path, 'w') as f:
         json.dump(index, f, indent=2)
+    os.replace(tmp_path, index_path)
     
     print(f"   ✅ Updated: {index_path}")
 
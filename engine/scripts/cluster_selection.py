@@ -3,23 +3,22 @@
 Cluster Selection Logic — v3 MVP
 
 Selects relevant clusters based on query + conversation context.
-Works with mocked clusters (HDBSCAN integration comes later).
+Clusters (HDBSCAN centroids) come from the `clusters` section that
+cluster.py writes into .discipline-index.json; they are loaded once and
+reloaded when the index file changes. The model only embeds the query.
 """
+import sys
 import numpy as np
-from typing import List, Dict, Optional
-from sentence_transformers import SentenceTransformer
+from pathlib import Path
+from typing import List, Dict, Optional, Union
 
-# Load embedding model (same as indexer)
-MODEL_NAME = "BAAI/bge-small-en-v1.5"
-embed_model = None  # Lazy load
+sys.path.insert(0, str(Path(__file__).parent))
+from query_cache import encode_cached
+from embedding_service import get_model
+from search import get_discipline
 
-
-def get_embed_model():
-    """Lazy load embedding model (shared across calls)."""
-    global embed_model
-    if embed_model is None:
-        embed_model = SentenceTransformer(MODEL_NAME)
-    return embed_model
+# Prepared cluster matrices per discipline: discipline → (index version, prepared)
+_prepared_clusters = {}
 
 
 def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
@@ -48,25 +47,24 @@ def build_query_embedding(query: str, history: List[str] = None) -> np.ndarray:
     Returns:
         Query embedding (384-dim)
     """
-    model = get_embed_model()
+    model = get_model()
+    recent_history = history[-3:] if history else []  # Last 3 messages
+    
+    # Query + history in one batched, cached call: history resent on every
+    # turn is a cache hit, so each turn only encodes new text
+    embeddings = encode_cached(model, [query] + recent_history)
     
     # Query embedding (primary signal)
-    query_emb = model.encode(query, convert_to_numpy=True)
+    query_emb = embeddings[0]
     
-    if history and len(history) > 0:
+    if recent_history:
         # CONTEXT DECAY: recent messages matter more
         # weights: [0.5, 0.3, 0.2] for [msg-1, msg-2, msg-3]
-        recent_history = history[-3:]  # Last 3 messages
         weights = [0.5, 0.3, 0.2][:len(recent_history)]  # Decay weights
         weights = weights[::-1]  # Reverse (oldest → newest)
         
         # Weighted context embedding
-        context_embs = []
-        for msg, weight in zip(recent_history, weights):
-            msg_emb = model.encode(msg, convert_to_numpy=True)
-            context_embs.append(weight * msg_emb)
-        
-        context_emb = np.sum(context_embs, axis=0)
+        context_emb = np.asarray(weights, dtype="float32") @ embeddings[1:]
         
         # Normalize context embedding
         context_emb = context_emb / np.linalg.norm(context_emb)
@@ -79,40 +77,82 @@ def build_query_embedding(query: str, history: List[str] = None) -> np.ndarray:
         return query_emb
 
 
-def score_clusters(query_emb: np.ndarray, clusters: List[Dict]) -> List[Dict]:
+def prepare_clusters(clusters: List[Dict]) -> Dict:
+    """
+    Precompute the scoring matrices for a list of clusters (once per load).
+    
+    Args:
+        clusters: List of cluster dicts with 'id' and 'centroid'
+    
+    Returns:
+        {
+            "clusters": [...],          # Row i = clusters[i]
+            "centroids": (n, dim),      # L2-normalized centroids (float32)
+            "size_penalty": (n,)        # log(cluster_size + 1)
+        }
+    """
+    if not clusters:
+        return {
+            "clusters": [],
+            "centroids": np.zeros((0, 0), dtype="float32"),
+            "size_penalty": np.zeros(0, dtype="float32")
+        }
+    
+    centroids = np.array([cluster["centroid"] for cluster in clusters], dtype="float32")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+    
+    # PENALIZE LARGE CLUSTERS: prevents "misc" clusters from always winning
+    sizes = np.array([len(cluster.get("book_ids", [])) for cluster in clusters], dtype="float32")
+    size_penalty = np.log(sizes + 1)  # log damping (gentle)
+    
+    return {
+        "clusters": clusters,
+        "centroids": centroids,
+        "size_penalty": size_penalty
+    }
+
+
+def score_clusters(query_emb: np.ndarray, clusters: Union[List[Dict], Dict]) -> List[Dict]:
     """
     Score clusters by similarity to query embedding.
     
     Penalizes large clusters (to prevent "generic" clusters from dominating).
+    One matrix-vector product over the pre-normalized centroids.
     
     Args:
         query_emb: Query embedding (384-dim)
-        clusters: List of cluster dicts with 'id' and 'centroid'
+        clusters: List of cluster dicts with 'id' and 'centroid',
+                  or the output of prepare_clusters() (reused across queries)
     
     Returns:
         List of scored clusters (sorted by adjusted score, descending)
     """
-    results = []
+    prepared = prepare_clusters(clusters) if isinstance(clusters, list) else clusters
+    clusters = prepared["clusters"]
     
-    for cluster in clusters:
-        centroid = np.array(cluster["centroid"])
-        raw_score = cosine_similarity(query_emb, centroid)
-        
-        # PENALIZE LARGE CLUSTERS: prevents "misc" clusters from always winning
-        cluster_size = len(cluster.get("book_ids", []))
-        size_penalty = np.log(cluster_size + 1)  # log damping (gentle)
-        adjusted_score = raw_score / size_penalty
-        
-        results.append({
-            "cluster_id": cluster["id"],
-            "name": cluster.get("name", cluster["id"]),
-            "score": float(adjusted_score),
-            "raw_score": float(raw_score),  # for debugging
-            "size_penalty": float(size_penalty),
-            "book_ids": cluster.get("book_ids", [])
-        })
-    
-    return sorted(results, key=lambda x: x["score"], reverse=True)
+    if not clusters:
+        return []
+    
+    query_emb = np.asarray(query_emb, dtype="float32")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        raw_scores = prepared["centroids"] @ (query_emb / np.linalg.norm(query_emb))
+        adjusted_scores = raw_scores / prepared["size_penalty"]
+    
+    # Stable descending order (ties keep cluster order, like sorted(reverse=True))
+    order = np.argsort(-adjusted_scores, kind="stable")
+    
+    return [
+        {
+            "cluster_id": clusters[i]["id"],
+            "name": clusters[i].get("name", clusters[i]["id"]),
+            "score": float(adjusted_scores[i]),
+            "raw_score": float(raw_scores[i]),  # for debugging
+            "size_penalty": float(prepared["size_penalty"][i]),
+            "book_ids": clusters[i].get("book_ids", [])
+        }
+        for i in order
+    ]
 
 
 def select_clusters(
@@ -171,55 +211,46 @@ def select_clusters(
     return selected
 
 
-def get_clusters_for_discipline(discipline: str) -> List[Dict]:
+def load_clusters(discipline: str) -> Dict:
     """
-    Load clusters for a discipline.
+    Prepared clusters for a discipline (see prepare_clusters()).
     
-    TODO: Replace with real cluster data from .discipline-index.json
-    For now, returns mocked clusters for testing.
+    Built from the cached discipline index and rebuilt only when
+    .discipline-index.json changes (e.g. after cluster.py reruns).
     
     Args:
         discipline: Discipline ID (e.g., "management_knowledge")
     
     Returns:
-        List of cluster dicts
+        Prepared clusters (empty if the discipline has no index or clusters)
+    """
+    try:
+        entry = get_discipline(discipline)
+    except FileNotFoundError:
+        return prepare_clusters([])
+    
+    cached = _prepared_clusters.get(discipline)
+    if cached is not None and cached[0] == entry["version"]:
+        return cached[1]
+    
+    # Clusters without a centroid cannot be scored
+    clusters = [c for c in entry["index"].get("clusters", []) if c.get("centroid")]
+    prepared = prepare_clusters(clusters)
+    _prepared_clusters[discipline] = (entry["version"], prepared)
+    return prepared
+
+
+def get_clusters_for_discipline(discipline: str) -> List[Dict]:
     """
-    # MOCKED DATA (replace with real cluster loading later)
-    # This simulates 3 clusters in management_knowledge
+    Load clusters for a discipline.
     
-    if discipline == "management_knowledge":
-        return [
-            {
-                "id": "taxonomies-classification",
-                "name": "Taxonomies & Classification Systems",
-                "centroid": get_embed_model().encode(
-                    "taxonomy classification hierarchical faceted organization systems",
-                    convert_to_numpy=True
-                ),
-                "book_ids": ["the_organization_of_information", "introduction_to_knowledge_organization"]
-            },
-            {
-                "id": "information-retrieval",
-                "name": "Information Retrieval & Search",
-                "centroid": get_embed_model().encode(
-                    "search retrieval indexing ranking query semantic similarity",
-                    convert_to_numpy=True
-                ),
-                "book_ids": ["introduction_to_information_retrieval"]
-            },
-            {
-                "id": "knowledge-management",
-                "name": "Knowledge Management & Innovation",
-                "centroid": get_embed_model().encode(
-                    "knowledge management innovation networks organizational learning",
-                    convert_to_numpy=True
-                ),
-                "book_ids": ["knowledge_management_and_innovation_in_networks", "knowledge_mapping_and_management"]
-            }
-        ]
+    Args:
+        discipline: Discipline ID (e.g., "management_knowledge")
     
-    # Fallback: return empty (will trigger global search)
-    return []
+    Returns:
+        List of cluster dicts (empty → global search)
+    """
+    return load_clusters(discipline)["clusters"]
 
 
 def cluster_aware_search(
@@ -249,10 +280,10 @@ def cluster_aware_search(
     # 1. Build query embedding (with context)
     query_emb = build_query_embedding(query, history)
     
-    # 2. Load clusters for discipline
-    clusters = get_clusters_for_discipline(discipline)
+    # 2. Load clusters for discipline (cached centroid matrix)
+    clusters = load_clusters(discipline)
     
-    if not clusters:
+    if not clusters["clusters"]:
         # No clusters → fallback to global search
         return {
             "selected_clusters": [],
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Embedding Cache — content-addressed chunk embeddings (persistent)
+
+Key   = sha256(model name + normalized chunk text)
+Value = float32 vector (raw model output, normalized later by the indexer)
+
+Rebuilds, re-chunking and books whose content hash changed mostly produce
+chunk texts we already embedded: those become a lookup instead of inference.
+
+Normalization: unicode NFC + collapsed whitespace (so re-extraction noise
+doesn't miss the cache).
+
+Storage: one SQLite file (stdlib, safe across concurrent indexer runs).
+
+Usage:
+    cache = EmbeddingCache("/app/books/.embedding_cache.sqlite", EMBEDDING_MODEL, 384)
+    vectors, missing = cache.get_many(texts)   # missing = indices to embed
+    cache.put_many([texts[i] for i in missing], new_vectors)
+"""
+import re
+import sqlite3
+import hashlib
+import unicodedata
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+LOOKUP_BATCH = 500  # SQLite host parameters per query
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of a chunk text for cache keys."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class EmbeddingCache:
+    """Persistent text → vector cache for one embedding model."""
+
+    def __init__(self, path: str, model_name: str, dim: int):
+        """
+        Args:
+            path: SQLite file (created on first use)
+            model_name: Embedding model (part of every key)
+            dim: Vector dimension (entries of another size are ignored)
+        """
+        self.path = Path(path)
+        self.model_name = model_name
+        self.dim = dim
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self.conn.commit()
+
+    def key(self, text: str) -> bytes:
+        """Cache key of one chunk text."""
+        return hashlib.sha256(
+            f"{self.model_name}\n{normalize_text(text)}".encode("utf-8")
+        ).digest()
+
+    def get_many(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Look up cached vectors.
+
+        Returns:
+            (vectors, missing)
+            vectors: float32 array (len(texts), dim), rows of missing texts are zero
+            missing: indices into `texts` that need embedding
+        """
+        keys = [self.key(text) for text in texts]
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), LOOKUP_BATCH):
+            batch = unique[start:start + LOOKUP_BATCH]
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                batch
+            )
+            for key, blob in rows:
+                if len(blob) == self.dim * 4:
+                    found[key] = blob
+
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        missing = []
+        for i, key in enumerate(keys):
+            blob = found.get(key)
+            if blob is None:
+                missing.append(i)
+            else:
+                vectors[i] = np.frombuffer(blob, dtype="float32")
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return vectors, missing
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """Store freshly embedded vectors (one transaction)."""
+        if not len(texts):
+            return
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(self.key(text), vector.tobytes()) for text, vector in zip(texts, vectors)]
+            )
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
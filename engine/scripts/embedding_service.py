@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Embedding Service — one embedding model per process (+ optional socket)
+
+Every script gets its model here instead of keeping its own
+SentenceTransformer global:
+
+    from embedding_service import get_model
+    vectors = get_model().encode(texts, convert_to_numpy=True)
+
+Local mode (default): the model is loaded once per process, from
+MODELS_DIR, and warm_up() pays the load + first-encode cost at startup.
+
+Socket mode: the MCP server (model already warm) serves encode requests
+on a local Unix socket (EMBED_SOCKET). Indexer runs spawned by the watcher
+call get_model(remote=True) and borrow that model instead of loading
+their own; if the socket is missing or the server goes away they fall
+back to a local model. EMBED_SOCKET="" disables socket mode.
+
+Protocol (one connection, any number of requests):
+    request:  u32 header_len, u32 0,           JSON {"texts": [...], "batch_size": n}
+    response: u32 header_len, u32 payload_len, JSON {"shape": [n, dim]} | {"error": "..."},
+              float32 payload (row-major)
+"""
+import os
+import json
+import struct
+import socket
+import logging
+import threading
+import socketserver
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+
+# Embedding model (same for indexers and search)
+EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+EMBEDDING_DIM = 384
+MODELS_DIR = Path(__file__).parent.parent / "models"
+
+EMBED_SOCKET = os.getenv("EMBED_SOCKET", "/tmp/librarian-embed.sock")
+CONNECT_TIMEOUT = 2.0    # Seconds to reach the server
+REQUEST_TIMEOUT = 600.0  # Seconds per encode request (large indexer batches)
+
+logger = logging.getLogger("librarian-embedding")
+
+_model = None
+_model_lock = threading.Lock()
+_socket_server = None
+
+
+def load_local_model():
+    """Load the SentenceTransformer from MODELS_DIR (slow: seconds)."""
+    from sentence_transformers import SentenceTransformer
+
+    logger.info(f"Loading embedding model: {EMBEDDING_MODEL}")
+    return SentenceTransformer(EMBEDDING_MODEL, cache_folder=str(MODELS_DIR))
+
+
+def get_model(remote: bool = False):
+    """
+    The process's embedding model (created once).
+
+    Args:
+        remote: Try the MCP server's model over EMBED_SOCKET first
+                (for short-lived processes such as watcher-spawned indexer runs)
+
+    Returns:
+        Object with SentenceTransformer-compatible .encode()
+    """
+    global _model
+    with _model_lock:
+        if _model is None:
+            if remote:
+                _model = connect_remote()
+            if _model is None:
+                _model = load_local_model()
+    return _model
+
+
+def warm_up():
+    """Load the model and run one encode (first call compiles/allocates)."""
+    get_model().encode(["warm up"], convert_to_numpy=True)
+    logger.info("Embedding model warm")
+
+
+# ============================================================================
+# SOCKET MODE
+# ============================================================================
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        block = sock.recv(size - len(data))
+        if not block:
+            raise ConnectionError("Embedding socket closed")
+        data.extend(block)
+    return bytes(data)
+
+
+def _send_message(sock: socket.socket, header: dict, payload: bytes = b""):
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(struct.pack(">II", len(data), len(payload)) + data + payload)
+
+
+def _recv_message(sock: socket.socket) -> tuple:
+    header_len, payload_len = struct.unpack(">II", _recv_exact(sock, 8))
+    header = json.loads(_recv_exact(sock, header_len))
+    return header, _recv_exact(sock, payload_len)
+
+
+class _EncodeHandler(socketserver.BaseRequestHandler):
+    """Serve encode requests on one client connection until it closes."""
+
+    def handle(self):
+        while True:
+            try:
+                request, _ = _recv_message(self.request)
+            except (ConnectionError, OSError, struct.error):
+                return
+
+            try:
+                vectors = get_model().encode(
+                    request["texts"],
+                    batch_size=request.get("batch_size", 32),
+                    convert_to_numpy=True
+                )
+                vectors = np.ascontiguousarray(vectors, dtype="float32")
+                _send_message(self.request, {"shape": list(vectors.shape)}, vectors.tobytes())
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                _send_message(self.request, {"error": str(e)})
+
+
+class _EncodeServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_socket(path: str = EMBED_SOCKET) -> Optional[socketserver.BaseServer]:
+    """
+    Serve this process's model on a Unix socket (background thread).
+
+    Returns:
+        The server, or None if socket mode is disabled/unavailable
+    """
+    global _socket_server
+    if not path or not hasattr(socket, "AF_UNIX"):
+        return None
+    if _socket_server is not None:
+        return _socket_server
+
+    # Stale socket from a previous run
+    Path(path).unlink(missing_ok=True)
+
+    server = _EncodeServer(path, _EncodeHandler)
+    os.chmod(path, 0o600)
+    threading.Thread(target=server.serve_forever, name="embed-socket", daemon=True).start()
+    _socket_server = server
+
+    logger.info(f"Embedding socket: {path}")
+    return server
+
+
+class RemoteModel:
+    """
+    SentenceTransformer-compatible .encode() backed by the embedding socket.
+
+    Falls back to a local model (for the rest of the process) if the
+    server goes away mid-run.
+    """
+
+    def __init__(self, sock: socket.socket, path: str):
+        self.sock = sock
+        self.path = path
+        self._local = None
+        self._lock = threading.Lock()
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        **kwargs
+    ) -> np.ndarray:
+        if self._local is not None:
+            return self._local.encode(sentences, batch_size=batch_size, convert_to_numpy=convert_to_numpy, **kwargs)
+
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        try:
+            with self._lock:
+                _send_message(self.sock, {"texts": texts, "batch_size": batch_size})
+                header, payload = _recv_message(self.sock)
+        except (ConnectionError, OSError, struct.error) as e:
+            logger.warning(f"Embedding socket lost ({e}), loading local model")
+            self.sock.close()
+            self._local = load_local_model()
+            return self.encode(sentences, batch_size=batch_size, convert_to_numpy=convert_to_numpy, **kwargs)
+
+        if "error" in header:
+            raise RuntimeError(header["error"])
+
+        vectors = np.frombuffer(payload, dtype="float32").reshape(header["shape"])
+        return vectors[0] if single else vectors
+
+
+def connect_remote(path: str = EMBED_SOCKET) -> Optional[RemoteModel]:
+    """Connect to a serving process's model (None if nothing is listening)."""
+    if not path or not hasattr(socket, "AF_UNIX") or not Path(path).exists():
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path)
+        sock.settimeout(REQUEST_TIMEOUT)
+    except OSError:
+        sock.close()
+        return None
+
+    logger.info(f"Using shared embedding model via {path}")
+    return RemoteModel(sock, path)
+
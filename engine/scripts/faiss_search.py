@@ -6,9 +6,23 @@ Abstraction layer for semantic retrieval over FAISS index
 import faiss
 import numpy as np
 import json
+import sys
 from pathlib import Path
 from typing import List, Dict, Optional
 import logging
+import os
+
+sys.path.insert(0, str(Path(__file__).parent))
+from chunk_store import ChunkStore
+from ann_index import search_params
+from query_cache import encode_cached
+
+# ANN search defaults (ignored by flat indexes; tune with ann_report.py)
+DEFAULT_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+DEFAULT_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+# Tombstoned rows (deleted books) are filtered after an over-fetch
+OVERFETCH_FACTOR = 2
 
 logger = logging.getLogger(__name__)
 
@@ -17,47 +31,64 @@ class FAISSSearch:
     Production-grade FAISS search interface
     
     Responsibilities:
-    - Load FAISS index + metadata
+    - Load FAISS index + open chunk store (mmap, rows decoded on demand)
     - Normalize query embeddings
     - Return ranked chunks with scores
     - Handle edge cases (empty index, invalid queries)
     """
     
-    def __init__(self, index_path: str, metadata_path: str):
+    def __init__(self, index_path: str, store_path: str):
         """
         Initialize FAISS searcher
         
         Args:
             index_path: Path to faiss.index file
-            metadata_path: Path to metadata.json file
+            store_path: Path to chunk store directory
         """
         self.index_path = Path(index_path)
-        self.metadata_path = Path(metadata_path)
+        self.store_path = Path(store_path)
         
         # Load index
         logger.info(f"Loading FAISS index from {self.index_path}")
         self.index = faiss.read_index(str(self.index_path))
         
-        # Load metadata
-        logger.info(f"Loading metadata from {self.metadata_path}")
-        with open(self.metadata_path) as f:
-            data = json.load(f)
-            self.chunks = data["chunks"]
-            self.books = {b["id"]: b for b in data.get("books", [])}
+        # Open chunk store (no chunk is decoded until it is returned)
+        logger.info(f"Opening chunk store at {self.store_path}")
+        self.chunks = ChunkStore(str(self.store_path))
+        if len(self.chunks) > self.index.ntotal:
+            # Indexing run in progress (or interrupted): its checkpointed rows
+            # have no vectors in faiss.index yet, serve the rows that do
+            logger.warning(
+                f"   Chunk store is ahead of FAISS ({len(self.chunks):,} chunks, "
+                f"{self.index.ntotal:,} vectors): serving the first {self.index.ntotal:,} rows"
+            )
+            self.chunks = ChunkStore(str(self.store_path), max_rows=self.index.ntotal)
+        self.chunks.open()  # Map segments now: they stay readable if compaction unlinks them
+        self.books = {b["id"]: b for b in self.chunks.books()}
         
         logger.info(f"✅ FAISS loaded: {self.index.ntotal:,} vectors, {len(self.chunks):,} chunks")
         
         # Validate consistency
         if self.index.ntotal != len(self.chunks):
             raise ValueError(
-                f"Index/metadata mismatch: {self.index.ntotal} vectors != {len(self.chunks)} chunks"
+                f"Index/chunk store mismatch: {self.index.ntotal} vectors != {len(self.chunks)} chunks"
             )
+        
+        # Build chunk_id → row index up front (keeps get_chunk O(1))
+        self.chunks.build_id_index()
+        
+        # Dead rows of deleted books (None = nothing to filter)
+        self.dead_rows = self.chunks.dead_mask()
+        if self.dead_rows is not None:
+            logger.info(f"   {int(self.dead_rows.sum()):,} tombstoned vectors (run indexer_v6.py compact to reclaim)")
     
     def search(
         self,
         query_embedding: List[float],
         k: int = 10,
-        min_score: Optional[float] = None
+        min_score: Optional[float] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
     ) -> List[Dict]:
         """
         Search for top-k similar chunks
@@ -66,6 +97,8 @@ class FAISSSearch:
             query_embedding: 384-dim embedding vector
             k: Number of results to return
             min_score: Optional score threshold (0-1)
+            nprobe: IVF lists to visit (IVF indexes, default FAISS_NPROBE)
+            ef_search: HNSW candidate list size (HNSW indexes, default FAISS_EF_SEARCH)
         
         Returns:
             List of chunks with metadata + scores
@@ -86,48 +119,167 @@ class FAISSSearch:
         if len(query_embedding) != self.index.d:
             raise ValueError(f"Query dimension {len(query_embedding)} != index dimension {self.index.d}")
         
-        # Normalize query (FAISS IndexFlatIP expects normalized vectors)
-        q = np.array(query_embedding, dtype="float32").reshape(1, -1)
+        return self.search_batch(
+            np.asarray(query_embedding).reshape(1, -1),
+            k=k,
+            min_score=min_score,
+            nprobe=nprobe,
+            ef_search=ef_search
+        )[0]
+    
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 10,
+        min_score: Optional[float] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        dedupe: bool = False
+    ) -> List[List[Dict]]:
+        """
+        Search several queries with one FAISS call
+        
+        Args:
+            query_embeddings: (n, 384) query matrix
+            k: Number of results per query
+            min_score: Optional score threshold (0-1)
+            nprobe: IVF lists to visit (optional)
+            ef_search: HNSW candidate list size (optional)
+            dedupe: Return each chunk once across all queries (kept for the
+                    query it scores highest on; queries keep up to k results)
+        
+        Returns:
+            One result list per query (same format as search())
+        """
+        q = np.array(query_embeddings, dtype="float32")
+        if q.ndim != 2 or q.shape[1] != self.index.d:
+            raise ValueError(f"Query matrix shape {q.shape} != (n, {self.index.d})")
+        if len(q) == 0:
+            return []
+        
+        # Normalize queries (inner-product indexes expect normalized vectors)
         faiss.normalize_L2(q)
         
-        # Search
-        scores, ids = self.index.search(q, k)
+        # Search (per-query ANN params, nothing mutated on the shared index)
+        params = search_params(
+            self.index,
+            nprobe=nprobe or DEFAULT_NPROBE,
+            ef_search=ef_search or DEFAULT_EF_SEARCH
+        )
         
-        # Build results
-        results = []
-        for score, idx in zip(scores[0], ids[0]):
-            # FAISS returns -1 for missing results
-            if idx < 0 or idx >= len(self.chunks):
-                continue
-            
-            # Apply score threshold
-            if min_score is not None and score < min_score:
+        # Dedupe needs candidates beyond each query's own top-k
+        fetch_k = max(k, min(self.index.ntotal, k * len(q))) if dedupe and len(q) > 1 else k
+        hits = self._search_live(q, fetch_k, params)
+        
+        # (score, row) per query: drop missing rows and apply score threshold
+        per_query = []
+        for scores, ids in hits:
+            keep = (ids >= 0) & (ids < len(self.chunks))
+            if min_score is not None:
+                keep &= scores >= min_score
+            per_query.append(list(zip(scores[keep].tolist(), ids[keep].tolist())))
+        
+        if dedupe:
+            per_query = self._dedupe(per_query, k)
+        
+        # Decode chunk records (only the returned rows, each once)
+        records = {}
+        return [
+            [self._result(row, score, records) for score, row in matches[:k]]
+            for matches in per_query
+        ]
+    
+    @staticmethod
+    def _dedupe(per_query: List[List[tuple]], k: int) -> List[List[tuple]]:
+        """
+        Assign each row to one query: best score first, up to k per query.
+        
+        Args:
+            per_query: (score, row) candidates per query, best first
+            k: Results per query
+        """
+        candidates = sorted(
+            ((score, qi, row) for qi, matches in enumerate(per_query) for score, row in matches),
+            key=lambda c: -c[0]  # Stable: ties go to the earlier query
+        )
+        
+        assigned = set()
+        deduped = [[] for _ in per_query]
+        for score, qi, row in candidates:
+            if row in assigned or len(deduped[qi]) >= k:
                 continue
+            assigned.add(row)
+            deduped[qi].append((score, row))
+        
+        return deduped
+    
+    def _result(self, row: int, score: float, records: Dict) -> Dict:
+        """Search result for one index row (chunk record + score + book info)."""
+        if row not in records:
+            records[row] = self.chunks.get(row)
+        chunk = records[row]
+        
+        # Handle both book_id and book_hash (mixed metadata from bootstrap)
+        book_key = chunk.get("book_id") or chunk.get("book_hash")
+        
+        # Enrich with book title
+        book = self.books.get(book_key, {})
+        
+        return {
+            **chunk,
+            "score": float(score),
+            "book_title": book.get("title", "Unknown"),
+            "book_author": book.get("author", "Unknown")
+        }
+    
+    def _search_live(self, q: np.ndarray, k: int, params) -> List[tuple]:
+        """
+        Top-k over live rows only, for each query row of q.
+        
+        Without tombstones this is one plain search. With tombstones,
+        over-fetch (k × OVERFETCH_FACTOR, growing ×4) until every query has
+        k live rows or the index is exhausted; only the queries still short
+        are searched again.
+        
+        Returns:
+            (scores, ids) per query
+        """
+        if self.dead_rows is None:
+            scores, ids = self.index.search(q, k, params=params)
+            return list(zip(scores, ids))
+        
+        results = [None] * len(q)
+        pending = np.arange(len(q))
+        fetch = min(self.index.ntotal, k * OVERFETCH_FACTOR)
+        while True:
+            scores, ids = self.index.search(q[pending], fetch, params=params)
             
-            # Get chunk metadata
-            chunk = self.chunks[idx]
-            
-            # Handle both book_id and book_hash (mixed metadata from bootstrap)
-            book_key = chunk.get("book_id") or chunk.get("book_hash")
+            still_short = []
+            for qi, row_scores, row_ids in zip(pending, scores, ids):
+                valid = row_ids >= 0
+                live = valid.copy()
+                live[valid] = ~self.dead_rows[row_ids[valid]]
+                
+                exhausted = fetch >= self.index.ntotal or not valid.all()
+                if live.sum() >= k or exhausted:
+                    results[qi] = (row_scores[live][:k], row_ids[live][:k])
+                else:
+                    still_short.append(qi)
             
-            # Enrich with book title
-            book = self.books.get(book_key, {})
+            if not still_short:
+                return results
             
-            results.append({
-                **chunk,
-                "score": float(score),
-                "book_title": book.get("title", "Unknown"),
-                "book_author": book.get("author", "Unknown")
-            })
-        
-        return results
+            pending = np.array(still_short)
+            fetch = min(self.index.ntotal, fetch * 4)
     
     def search_text(
         self,
         query_text: str,
         embedding_model,
         k: int = 10,
-        min_score: Optional[float] = None
+        min_score: Optional[float] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
     ) -> List[Dict]:
         """
         Convenience wrapper: text → embedding → search
@@ -137,15 +289,53 @@ class FAISSSearch:
             embedding_model: Model with .encode() method
             k: Number of results
             min_score: Optional threshold
+            nprobe: IVF lists to visit (optional)
+            ef_search: HNSW candidate list size (optional)
         
         Returns:
             Search results
         """
-        # Generate embedding
-        embedding = embedding_model.encode(query_text).tolist()
+        # Generate embedding (shared query cache)
+        embedding = encode_cached(embedding_model, query_text)
         
         # Search
-        return self.search(embedding, k=k, min_score=min_score)
+        return self.search(embedding, k=k, min_score=min_score, nprobe=nprobe, ef_search=ef_search)
+    
+    def search_text_batch(
+        self,
+        query_texts: List[str],
+        embedding_model,
+        k: int = 10,
+        min_score: Optional[float] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        dedupe: bool = False
+    ) -> List[List[Dict]]:
+        """
+        Batch wrapper: texts → one encode call → one FAISS search
+        
+        Args:
+            query_texts: Natural language queries
+            embedding_model: Model with .encode() method
+            k: Number of results per query
+            min_score: Optional threshold
+            nprobe: IVF lists to visit (optional)
+            ef_search: HNSW candidate list size (optional)
+            dedupe: Return each chunk once across all queries
+        
+        Returns:
+            One result list per query
+        """
+        if not query_texts:
+            return []
+        
+        # Generate embeddings (shared query cache, misses encoded in one batch)
+        embeddings = encode_cached(embedding_model, query_texts)
+        
+        # Search
+        return self.search_batch(
+            embeddings, k=k, min_score=min_score, nprobe=nprobe, ef_search=ef_search, dedupe=dedupe
+        )
     
     def get_stats(self) -> Dict:
         """
@@ -156,6 +346,7 @@ class FAISSSearch:
                 "total_vectors": int,
                 "total_chunks": int,
                 "total_books": int,
+                "dead_vectors": int,
                 "dimensions": int,
                 "index_type": str
             }
@@ -164,13 +355,14 @@ class FAISSSearch:
             "total_vectors": self.index.ntotal,
             "total_chunks": len(self.chunks),
             "total_books": len(self.books),
+            "dead_vectors": int(self.dead_rows.sum()) if self.dead_rows is not None else 0,
             "dimensions": self.index.d,
             "index_type": type(self.index).__name__
         }
     
     def get_chunk_by_id(self, chunk_id: str) -> Optional[Dict]:
         """
-        Retrieve specific chunk by ID
+        Retrieve specific chunk by ID (O(1) hash lookup)
         
         Args:
             chunk_id: Chunk identifier
@@ -178,10 +370,19 @@ class FAISSSearch:
         Returns:
             Chunk metadata or None
         """
-        for chunk in self.chunks:
-            if chunk["chunk_id"] == chunk_id:
-                return chunk
-        return None
+        return self.chunks.get_by_id(chunk_id)
+    
+    def get_chunks(self, chunk_ids: List[str]) -> List[Optional[Dict]]:
+        """
+        Retrieve several chunks by ID in one call
+        
+        Args:
+            chunk_ids: Chunk identifiers
+        
+        Returns:
+            Chunk metadata per ID (same order, None if not found)
+        """
+        return self.chunks.get_many_by_id(chunk_ids)
 
 
 # Singleton loader (lazy initialization)
@@ -189,22 +390,26 @@ _searcher: Optional[FAISSSearch] = None
 
 def get_searcher(
     index_path: str = "/app/books/faiss.index",
-    metadata_path: str = "/app/books/metadata.json"
+    store_path: str = "/app/books/chunks",
+    reload: bool = False
 ) -> FAISSSearch:
     """
     Get or create singleton FAISS searcher
     
     Args:
         index_path: Path to FAISS index
-        metadata_path: Path to metadata JSON
+        store_path: Path to chunk store directory
+        reload: Load a fresh searcher from disk and make it the singleton
+                (the previous one stays valid for callers still holding it)
     
     Returns:
         FAISSSearch instance (cached)
     """
     global _searcher
     
-    if _searcher is None:
-        _searcher = FAISSSearch(index_path, metadata_path)
+    if _searcher is None or reload:
+        searcher = FAISSSearch(index_path, store_path)  # Loaded before the swap
+        _searcher = searcher
     
     return _searcher
 
@@ -224,8 +429,8 @@ if __name__ == "__main__":
     
     # Test search (requires embedding model)
     try:
-        from sentence_transformers import SentenceTransformer
-        model = SentenceTransformer("BAAI/bge-small-en-v1.5")
+        from embedding_service import get_model
+        model = get_model()
         
         query = sys.argv[1] if len(sys.argv) > 1 else "quantum mechanics"
         print(f"\n🔍 Test Query: '{query}'")
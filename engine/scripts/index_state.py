@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Index State Store — the indexer's source of truth, persisted incrementally
+
+Same dict the indexer has always worked with:
+
+    {"file_cache": {path: {...}}, "books": {hash: {...}},
+     "total_chunks": n, "total_books": n, "last_updated": t}
+
+but kept in one SQLite file (WAL) with a row per book and per file_cache
+entry instead of one JSON document. save() compares the state against the
+last loaded/saved snapshot and writes only the rows that changed, in one
+transaction: a 10-book checkpoint on a 50k-file library touches ~10 rows
+instead of rewriting the whole file.
+
+Migration: the first load() imports a legacy .index_state.json (renamed to
+.index_state.json.migrated afterwards).
+
+Usage:
+    store = IndexStateStore("/app/books/.index_state.sqlite", legacy_path="/app/books/.index_state.json")
+    state = store.load()
+    state["books"][book_hash] = {...}
+    store.save(state)            # Writes the changed rows only
+
+    read_books(path)             # Readers (reader server): books only, read-only
+
+    python index_state.py        # Summary (totals, row counts)
+"""
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Default location (the indexer and the reader both use it)
+INDEX_STATE_DB = Path("/app/books/.index_state.sqlite")
+LEGACY_STATE_PATH = Path("/app/books/.index_state.json")
+
+# Tables holding one row per entry of a state dict (everything else goes to meta)
+ROW_TABLES = ("books", "file_cache")
+
+
+def empty_state() -> Dict:
+    return {
+        "file_cache": {},
+        "books": {},
+        "total_chunks": 0,
+        "total_books": 0,
+        "last_updated": 0
+    }
+
+
+def _encode(value) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+class IndexStateStore:
+    """SQLite-backed index state with row-level incremental saves."""
+
+    def __init__(self, path: str, legacy_path: Optional[str] = None):
+        """
+        Args:
+            path: SQLite file (created on first use)
+            legacy_path: Old .index_state.json to import if the store is empty
+        """
+        self.path = Path(path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+
+        # Last persisted encoding of every row: {table: {key: json}}
+        self._snapshot = None
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")  # Checkpoints must survive a crash
+        for table in ROW_TABLES + ("meta",):
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+        self.conn.commit()
+
+    def _read(self) -> Dict[str, Dict[str, str]]:
+        return {
+            table: dict(self.conn.execute(f"SELECT key, value FROM {table}"))
+            for table in ROW_TABLES + ("meta",)
+        }
+
+    def _encode_state(self, state: Dict) -> Dict[str, Dict[str, str]]:
+        encoded = {
+            table: {key: _encode(value) for key, value in state.get(table, {}).items()}
+            for table in ROW_TABLES
+        }
+        encoded["meta"] = {
+            key: _encode(value) for key, value in state.items() if key not in ROW_TABLES
+        }
+        return encoded
+
+    def load(self) -> Dict:
+        """
+        Load the full state (imports the legacy JSON file on first use).
+
+        Returns:
+            State dict (see module docstring); defaults if nothing is indexed
+        """
+        rows = self._read()
+        if not any(rows.values()) and self.legacy_path and self.legacy_path.exists():
+            self._import_legacy()
+            rows = self._read()
+
+        state = empty_state()
+        for key, value in rows["meta"].items():
+            state[key] = json.loads(value)
+        for table in ROW_TABLES:
+            state[table] = {key: json.loads(value) for key, value in rows[table].items()}
+
+        self._snapshot = rows
+        return state
+
+    def _import_legacy(self):
+        with open(self.legacy_path) as f:
+            state = json.load(f)
+        state.setdefault("file_cache", {})
+
+        self._snapshot = {table: {} for table in ROW_TABLES + ("meta",)}
+        self.save(state)
+        self.legacy_path.rename(self.legacy_path.with_name(self.legacy_path.name + ".migrated"))
+        print(f"📦 Migrated {self.legacy_path.name} → {self.path.name} ({len(state['books'])} books)")
+
+    def save(self, state: Dict) -> Tuple[int, int]:
+        """
+        Persist `state`, writing only rows that differ from the last load/save.
+
+        Returns:
+            (rows upserted, rows deleted)
+        """
+        if self._snapshot is None:
+            self._snapshot = self._read()
+
+        encoded = self._encode_state(state)
+        upserts = {}
+        deletes = {}
+        for table, rows in encoded.items():
+            previous = self._snapshot[table]
+            upserts[table] = [(key, value) for key, value in rows.items() if previous.get(key) != value]
+            deletes[table] = [(key,) for key in previous if key not in rows]
+
+        with self.conn:
+            for table in encoded:
+                if upserts[table]:
+                    self.conn.executemany(
+                        f"INSERT OR REPLACE INTO {table} (key, value) VALUES (?, ?)", upserts[table]
+                    )
+                if deletes[table]:
+                    self.conn.executemany(f"DELETE FROM {table} WHERE key = ?", deletes[table])
+
+        self._snapshot = encoded
+        return (
+            sum(len(rows) for rows in upserts.values()),
+            sum(len(rows) for rows in deletes.values())
+        )
+
+    def close(self):
+        self.conn.close()
+
+
+def read_books(path: str = INDEX_STATE_DB, legacy_path: Optional[str] = LEGACY_STATE_PATH) -> Dict[str, Dict]:
+    """
+    Indexed books ({hash: {path, chunk_range, ...}}) without loading file_cache.
+
+    Opens the store read-only; falls back to the legacy JSON file if the
+    indexer hasn't migrated it yet.
+    """
+    path = Path(path)
+    if path.exists():
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+        try:
+            return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM books")}
+        finally:
+            conn.close()
+
+    if legacy_path and Path(legacy_path).exists():
+        with open(legacy_path) as f:
+            return json.load(f).get("books", {})
+    return {}
+
+
+if __name__ == "__main__":
+    import sys
+
+    db = Path(sys.argv[1]) if len(sys.argv) > 1 else INDEX_STATE_DB
+    if not db.exists():
+        print(f"❌ No index state at {db}")
+        sys.exit(1)
+
+    store = IndexStateStore(db)
+    state = store.load()
+    print(json.dumps({
+        "total_books": state["total_books"],
+        "total_chunks": state["total_chunks"],
+        "last_updated": state["last_updated"],
+        "books": len(state["books"]),
+        "file_cache": len(state["file_cache"])
+    }, indent=2))
@@ -174,8 +174,11 @@ def index_discipline(discipline_id: str, discipline_path: Path):
         "clusters": []  # Populated by cluster.py later
     }
     
-    with open(index_path, 'w') as f:
+    # Atomic replace: the MCP server hot-reloads this file
+    tmp_path = index_path.with_suffix(".json.tmp")
+    with open(tmp_path, 'w') as f:
         json.dump(discipline_index, f, indent=2)
+    os.replace(tmp_path, index_path)
     
     print(f"   ✅ Saved: {index_path}")
 
@@ -2,7 +2,7 @@
 """
 Librarian Indexer v5.1 — FAISS-Based (No OOM)
 
-Optimized indexer that uses FAISS + metadata.json for duplicate detection.
+Optimized indexer that uses FAISS + chunk store for duplicate detection.
 Avoids loading 2.3GB legacy JSON into memory.
 """
 import os
@@ -17,8 +17,6 @@ from pathlib import Path
 from typing import List, Dict, Optional, Set
 import uuid
 
-from sentence_transformers import SentenceTransformer
-
 # Import text extraction
 sys.path.insert(0, str(Path(__file__).parent))
 from text_extraction import (
@@ -26,28 +24,27 @@ from text_extraction import (
     extract_pdf_paragraphs,
     chunk_paragraphs
 )
+from chunk_store import ChunkStore
+from embedding_cache import EmbeddingCache
+from embedding_service import EMBEDDING_MODEL, EMBEDDING_DIM, get_model
 
 # Paths
 LIBRARY_ROOT = Path("/app/books")
-MODELS_DIR = Path("/app/engine/models")
 FAISS_INDEX_PATH = LIBRARY_ROOT / "faiss.index"
-METADATA_PATH = LIBRARY_ROOT / "metadata.json"
+CHUNK_STORE_DIR = LIBRARY_ROOT / "chunks"
 NO_INDEXING_DIR = LIBRARY_ROOT / "no-indexing"
+EMBEDDING_CACHE_PATH = LIBRARY_ROOT / ".embedding_cache.sqlite"
 
-# Embedding model
-EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
-EMBEDDING_DIM = 384
-
-# Global model (lazy load)
-embed_model = None
+# Global embedding cache (lazy load; model comes from embedding_service)
+embedding_cache = None
 
 
-def get_embed_model():
-    """Lazy load embedding model."""
-    global embed_model
-    if embed_model is None:
-        embed_model = SentenceTransformer(EMBEDDING_MODEL, cache_folder=str(MODELS_DIR))
-    return embed_model
+def get_embedding_cache() -> EmbeddingCache:
+    """Lazy open the persistent chunk embedding cache (shared with indexer_v6)."""
+    global embedding_cache
+    if embedding_cache is None:
+        embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_MODEL, EMBEDDING_DIM)
+    return embedding_cache
 
 
 def compute_book_id(book_path: Path) -> str:
@@ -63,27 +60,21 @@ def compute_book_id(book_path: Path) -> str:
 
 def load_existing_book_ids() -> Set[str]:
     """
-    Load existing book IDs from metadata.json.
-    Much smaller than loading full index (433MB vs 2.3GB).
+    Load existing book IDs from the chunk store's book table.
+    Much smaller than loading full index (no chunk is decoded).
     """
-    if not METADATA_PATH.exists():
+    store = ChunkStore(CHUNK_STORE_DIR)
+    if not store.exists():
         return set()
     
     try:
-        with open(METADATA_PATH) as f:
-            metadata = json.load(f)
-        
-        book_ids = set()
+        book_ids = {book["id"] for book in store.books()}
         
-        # Extract book IDs from chunks
-        for chunk in metadata.get("chunks", []):
-            book_ids.add(chunk["book_id"])
-        
-        print(f"   Loaded {len(book_ids)} existing book IDs from metadata")
+        print(f"   Loaded {len(book_ids)} existing book IDs from chunk store")
         return book_ids
     
     except Exception as e:
-        print(f"⚠️  Failed to load metadata: {e}")
+        print(f"⚠️  Failed to load chunk store: {e}")
         return set()
 
 
@@ -167,19 +158,27 @@ def process_book(book_path: Path, existing_book_ids: Set[str]) -> Optional[Dict]
         move_to_no_indexing(book_path, "No chunks generated")
         return None
     
-    # Generate embeddings
-    model = get_embed_model()
+    # Generate embeddings (cache first, model only for unseen texts)
+    cache = get_embedding_cache()
+    cached, missing = cache.get_many([chunk["text"] for chunk in chunks])
+    missing = set(missing)
+    new_texts, new_embeddings = [], []
     chunk_objects = []
     
-    for chunk in chunks:
+    for i, chunk in enumerate(chunks):
         chunk_id = f"ch_{uuid.uuid4().hex[:12]}"
         text = chunk["text"]
         
-        try:
-            embedding = model.encode(text, convert_to_numpy=True)
-        except Exception as e:
-            print(f" ⚠️  Embedding failed: {e}")
-            continue
+        if i in missing:
+            try:
+                embedding = get_model(remote=True).encode(text, convert_to_numpy=True)
+            except Exception as e:
+                print(f" ⚠️  Embedding failed: {e}")
+                continue
+            new_texts.append(text)
+            new_embeddings.append(embedding)
+        else:
+            embedding = cached[i]
         
         chunk_obj = {
             "chunk_id": chunk_id,
@@ -192,7 +191,10 @@ def process_book(book_path: Path, existing_book_ids: Set[str]) -> Optional[Dict]
         
         chunk_objects.append(chunk_obj)
     
-    print(f" ✓ ({len(chunk_objects)} chunks)")
+    if new_texts:
+        cache.put_many(new_texts, np.array(new_embeddings, dtype="float32"))
+    
+    print(f" ✓ ({len(chunk_objects)} chunks, {len(chunks) - len(missing)} cached)")
     
     # Book metadata
     book_meta = {
@@ -233,7 +235,7 @@ def build_faiss_index(all_chunks: List[Dict]) -> faiss.Index:
 
 
 def save_faiss_index(index: faiss.Index, chunks: List[Dict], books: List[Dict]):
-    """Save FAISS index + metadata atomically."""
+    """Save FAISS index + chunk store atomically."""
     import tempfile
     
     print(f"\n   Saving FAISS index...")
@@ -243,28 +245,16 @@ def save_faiss_index(index: faiss.Index, chunks: List[Dict], books: List[Dict]):
     faiss.write_index(index, temp_index.name)
     os.replace(temp_index.name, FAISS_INDEX_PATH)
     
-    # 2. Save metadata (without embeddings)
-    metadata = {
-        "books": books,
-        "chunks": [
-            {k: v for k, v in c.items() if k != "embedding"}
-            for c in chunks
-        ]
-    }
-    
-    temp_meta = tempfile.NamedTemporaryFile("w", delete=False, dir=LIBRARY_ROOT)
-    json.dump(metadata, temp_meta, indent=2)
-    temp_meta.flush()
-    os.fsync(temp_meta.fileno())
-    temp_meta.close()
-    os.replace(temp_meta.name, METADATA_PATH)
+    # 2. Save chunk store (full rewrite, embeddings stripped)
+    store = ChunkStore(CHUNK_STORE_DIR)
+    store.replace_all(chunks, books)
     
     # Get sizes
     faiss_size = FAISS_INDEX_PATH.stat().st_size / 1024 / 1024
-    meta_size = METADATA_PATH.stat().st_size / 1024 / 1024
+    meta_size = store.size_bytes() / 1024 / 1024
     
     print(f"   ✓ FAISS index: {faiss_size:.1f} MB")
-    print(f"   ✓ Metadata: {meta_size:.1f} MB")
+    print(f"   ✓ Chunk store: {meta_size:.1f} MB")
 
 
 def index_all_books():
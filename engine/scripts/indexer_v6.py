@@ -4,59 +4,101 @@ Librarian Indexer v6 — Production Incremental Architecture
 
 Three-layer design:
 1. Discovery Layer: scan filesystem, compute hashes
-2. State Layer: index_state.json (source of truth)
-3. Storage Layer: FAISS (append-only embedding log)
+2. State Layer: index state store (SQLite, source of truth)
+3. Storage Layer: FAISS + chunk store (append-only segments + manifest)
 
 Key properties:
 - Identity = content hash (not path)
 - Path = metadata only (can move freely)
 - O(Δ) processing (only new books)
 - FAISS append-only (no rebuild)
+- Resumable: every CHECKPOINT_BOOKS books, chunk records + vectors + state
+  are committed together (an interrupted run resumes at the last checkpoint);
+  the FAISS index itself is written once per run
 """
 import os
 import sys
-import json
 import hashlib
 import time
 import shutil
 import faiss
 import numpy as np
 from pathlib import Path
-from typing import List, Dict, Optional, Set
+from typing import List, Dict, Optional, Set, Tuple
+import json
 import uuid
 import tempfile
-
-from sentence_transformers import SentenceTransformer
+import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 
 # Import text extraction
 sys.path.insert(0, str(Path(__file__).parent))
 from text_extraction import (
-    extract_epub_paragraphs,
+    iter_epub_paragraphs,
     extract_pdf_paragraphs,
     chunk_paragraphs
 )
+from chunk_store import ChunkStore, migrate_metadata_json
+from ann_index import build_index, index_kind, read_vectors, INDEX_TYPES
+from embedding_cache import EmbeddingCache
+from embedding_service import EMBEDDING_MODEL, EMBEDDING_DIM, get_model
+from index_state import IndexStateStore
 
 # Paths
 LIBRARY_ROOT = Path("/app/books")
-MODELS_DIR = Path("/app/engine/models")
 FAISS_INDEX_PATH = LIBRARY_ROOT / "faiss.index"
-METADATA_PATH = LIBRARY_ROOT / "metadata.json"
-INDEX_STATE_PATH = LIBRARY_ROOT / ".index_state.json"
+CHUNK_STORE_DIR = LIBRARY_ROOT / "chunks"
+METADATA_PATH = LIBRARY_ROOT / "metadata.json"  # Legacy (migrated into chunk store)
+INDEX_STATE_PATH = LIBRARY_ROOT / ".index_state.sqlite"
+LEGACY_STATE_PATH = LIBRARY_ROOT / ".index_state.json"  # Legacy (migrated into the state store)
+EMBEDDING_CACHE_PATH = LIBRARY_ROOT / ".embedding_cache.sqlite"
 NO_INDEXING_DIR = LIBRARY_ROOT / "no-indexing"
+COMPACT_INDEX_PATH = LIBRARY_ROOT / "faiss.index.compact"  # Compacted index before the switch
+COMPACTION_MARKER_PATH = LIBRARY_ROOT / ".compaction.json"  # Compaction commit point
+
+# Embedding (model shared via embedding_service: MCP server's model when it's running)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))  # Chunks per model.encode call
+
+# Books per checkpoint (chunk records + vectors + state committed together)
+CHECKPOINT_BOOKS = int(os.getenv("CHECKPOINT_BOOKS", "10"))
+
+# ANN index type (flat until the library crosses ANN_THRESHOLD vectors)
+# Pick settings with evidence: python ann_report.py
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")  # flat | ivf | hnsw | ivfpq
+ANN_THRESHOLD = int(os.getenv("ANN_THRESHOLD", "50000"))
+
+# Extraction worker pool (EPUB/PDF parsing is CPU-bound)
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+
+# Discovery thread pool (stat + hashing are I/O-bound)
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
+BOOK_EXTENSIONS = (".epub", ".pdf")
+
+# Content identity: sampled fingerprint (head + tail + strided blocks + size)
+FINGERPRINT_BLOCK = 64 * 1024  # Bytes per sampled block
+FINGERPRINT_STRIDES = 8        # Blocks between head and tail
+VERIFY_HASHES = os.getenv("VERIFY_HASHES", "") == "1"  # Also hash full content (see scan_filesystem)
 
-# Embedding model
-EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
-EMBEDDING_DIM = 384
+embedding_cache = None
+state_store = None
 
-embed_model = None
 
+def get_state_store() -> IndexStateStore:
+    """Lazy open the index state store (migrates the legacy JSON state)."""
+    global state_store
+    if state_store is None:
+        state_store = IndexStateStore(INDEX_STATE_PATH, legacy_path=LEGACY_STATE_PATH)
+    return state_store
 
-def get_embed_model():
-    """Lazy load embedding model."""
-    global embed_model
-    if embed_model is None:
-        embed_model = SentenceTransformer(EMBEDDING_MODEL, cache_folder=str(MODELS_DIR))
-    return embed_model
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Lazy open the persistent chunk embedding cache."""
+    global embedding_cache
+    if embedding_cache is None:
+        embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_MODEL, EMBEDDING_DIM)
+    return embedding_cache
 
 
 # ============================================================================
@@ -64,28 +106,157 @@ def get_embed_model():
 # ============================================================================
 
 def compute_book_hash(file_path: Path) -> str:
-    """Content-based identity (stable across moves)."""
+    """
+    Content-based identity (stable across moves).
+    
+    Sampled fingerprint: file size + head block + tail block +
+    FINGERPRINT_STRIDES evenly spaced blocks (BLAKE2b, 16 hex chars).
+    Reads at most (FINGERPRINT_STRIDES + 2) × FINGERPRINT_BLOCK bytes
+    whatever the file size; smaller files are hashed whole. Editions that
+    share a header still differ in size, tail or sampled blocks.
+    """
     try:
+        size = file_path.stat().st_size
+        hasher = hashlib.blake2b(digest_size=16, person=b"librarian-fp1")
+        hasher.update(size.to_bytes(8, "little"))
+        
         with open(file_path, 'rb') as f:
-            content_sample = f.read(1024 * 1024)  # 1MB sample
-        return hashlib.sha256(content_sample).hexdigest()[:16]
+            if size <= (FINGERPRINT_STRIDES + 2) * FINGERPRINT_BLOCK:
+                hasher.update(f.read())
+            else:
+                last = size - FINGERPRINT_BLOCK
+                offsets = [0] + [
+                    last * i // (FINGERPRINT_STRIDES + 1)
+                    for i in range(1, FINGERPRINT_STRIDES + 1)
+                ] + [last]
+                for offset in offsets:
+                    f.seek(offset)
+                    hasher.update(f.read(FINGERPRINT_BLOCK))
+        
+        return hasher.hexdigest()[:16]
     except Exception as e:
         # Fallback to path-based hash (better than crash)
         return hashlib.sha256(str(file_path).encode()).hexdigest()[:16]
 
 
-def get_file_fingerprint(file_path: Path) -> tuple:
-    """Fast fingerprint for change detection (size, mtime)."""
+def compute_legacy_book_hash(file_path: Path) -> Optional[str]:
+    """Pre-fingerprint identity: sha256 of the first 1MB (books indexed before)."""
+    try:
+        with open(file_path, 'rb') as f:
+            content_sample = f.read(1024 * 1024)  # 1MB sample
+        return hashlib.sha256(content_sample).hexdigest()[:16]
+    except Exception:
+        return None
+
+
+def compute_full_hash(file_path: Path) -> Optional[str]:
+    """BLAKE2b of the whole file (VERIFY_HASHES mode)."""
+    try:
+        hasher = hashlib.blake2b(digest_size=32)
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+    except Exception:
+        return None
+
+
+def get_file_fingerprint(file_path: Path) -> list:
+    """Fast fingerprint for change detection [size, mtime] (a list, as stored in JSON)."""
     stat = file_path.stat()
-    return (stat.st_size, int(stat.st_mtime))
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+def walk_library(root: Path) -> List[Path]:
+    """
+    Single-pass discovery of book files (os.scandir, no stat per file).
+    
+    Hidden entries and no-indexing/ folders are pruned during the walk
+    (never descended into).
+    
+    Returns:
+        Book paths: EPUBs first, then PDFs
+    """
+    found = {ext: [] for ext in BOOK_EXTENSIONS}
+    pending = [str(root)]
+    
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            if name != 'no-indexing':
+                                pending.append(entry.path)
+                            continue
+                    except OSError:
+                        continue
+                    ext = os.path.splitext(name)[1]
+                    if ext in found:
+                        found[ext].append(Path(entry.path))
+        except OSError as e:
+            print(f"   ⚠️  Cannot scan {directory}: {e}")
+    
+    return [path for ext in BOOK_EXTENSIONS for path in found[ext]]
 
 
-def scan_filesystem(state: Dict) -> Dict[str, Dict]:
+def scan_file(
+    file_path: Path,
+    cached: Optional[Dict],
+    indexed: Dict,
+    verify: bool = False
+) -> Tuple[list, str, bool, Optional[str]]:
+    """
+    Fingerprint one file and resolve its content hash.
+    
+    Args:
+        file_path: Book file
+        cached: file_cache entry for this path (if any)
+        indexed: state["books"] (identities already in the index)
+        verify: Also compute the full-content hash
+    
+    Returns:
+        (fingerprint, book_hash, from_cache, full_hash)
+    """
+    fingerprint = get_file_fingerprint(file_path)
+    
+    # Check cache (fast path)
+    if cached and list(cached["fingerprint"]) == fingerprint and (cached.get("full_hash") or not verify):
+        # File unchanged → reuse hash
+        return fingerprint, cached["hash"], True, cached.get("full_hash")
+    
+    # File changed or new → compute hash (slow path)
+    book_hash = compute_book_hash(file_path)
+    if book_hash not in indexed:
+        # Indexed under the legacy 1MB identity → keep that identity, but only
+        # for the very file indexed under it (another edition sharing the
+        # first 1MB is a new book; a moved legacy book is simply re-indexed)
+        legacy_hash = compute_legacy_book_hash(file_path)
+        if legacy_hash in indexed and indexed[legacy_hash]["path"] == str(file_path):
+            book_hash = legacy_hash
+    
+    full_hash = compute_full_hash(file_path) if verify else None
+    return fingerprint, book_hash, False, full_hash
+
+
+def scan_filesystem(state: Dict, verify: bool = VERIFY_HASHES) -> Dict[str, Dict]:
     """
     Scan library with fingerprint-based caching.
     
-    Fast path: if (size, mtime) unchanged → reuse cached hash
-    Slow path: if changed or new → compute hash
+    Phases (timed):
+    1. Walk: one os.scandir pass, hidden + no-indexing dirs pruned
+    2. Stat + hash: thread pool (SCAN_WORKERS)
+       Fast path: if (size, mtime) unchanged → reuse cached hash
+       Slow path: if changed or new → compute hash
+    
+    Verify mode (VERIFY_HASHES=1 or `index --verify`): every file also gets
+    a full-content hash (cached like the sampled one). Two files with the
+    same sampled identity but different content are reported, and the
+    second one is identified by its full hash instead of being merged.
     
     Returns:
         {
@@ -103,38 +274,42 @@ def scan_filesystem(state: Dict) -> Dict[str, Dict]:
     updated_cache = {}
     
     # Stats for reporting
-    stats = {"total": 0, "cached": 0, "hashed": 0}
+    stats = {"total": 0, "cached": 0, "hashed": 0, "collisions": 0}
+    indexed = state.get("books", {})
     
-    for ext in ['*.epub', '*.pdf']:
-        for file_path in LIBRARY_ROOT.rglob(ext):
-            # Skip hidden files and no-indexing folder
-            if any(p.startswith('.') for p in file_path.parts):
-                continue
-            if 'no-indexing' in file_path.parts:
-                continue
-            
+    # 1. Walk
+    started = time.perf_counter()
+    paths = walk_library(LIBRARY_ROOT)
+    walk_seconds = time.perf_counter() - started
+    
+    # 2. Stat + hash in parallel (results consumed in walk order)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+        scans = pool.map(
+            lambda path: scan_file(path, file_cache.get(str(path)), indexed, verify),
+            paths
+        )
+        
+        for file_path, scanned in zip(paths, scans):
+            fingerprint, book_hash, from_cache, full_hash = scanned
             stats["total"] += 1
+            stats["cached" if from_cache else "hashed"] += 1
             path_str = str(file_path)
             
-            # Get current fingerprint
-            fingerprint = get_file_fingerprint(file_path)
-            
-            # Check cache (fast path)
-            cached = file_cache.get(path_str)
-            if cached and cached["fingerprint"] == fingerprint:
-                # File unchanged → reuse hash
-                book_hash = cached["hash"]
-                stats["cached"] += 1
-            else:
-                # File changed or new → compute hash (slow path)
-                book_hash = compute_book_hash(file_path)
-                stats["hashed"] += 1
+            # Same sampled identity, different content → identify by full hash
+            other = discovered.get(book_hash)
+            if full_hash and other and other.get("full_hash") and other["full_hash"] != full_hash:
+                print(f"   ⚠️  Fingerprint collision: {path_str} vs {other['path']} (using full hash)")
+                book_hash = full_hash[:16]
+                stats["collisions"] += 1
             
             # Update file cache
             updated_cache[path_str] = {
                 "fingerprint": fingerprint,
                 "hash": book_hash
             }
+            if full_hash:
+                updated_cache[path_str]["full_hash"] = full_hash
             
             # Add to discovered
             discovered[book_hash] = {
@@ -143,11 +318,17 @@ def scan_filesystem(state: Dict) -> Dict[str, Dict]:
                 "mtime": fingerprint[1],
                 "filetype": file_path.suffix.lstrip('.')
             }
+            if full_hash:
+                discovered[book_hash]["full_hash"] = full_hash
+    scan_seconds = time.perf_counter() - started
     
     # Update state with new cache
     state["file_cache"] = updated_cache
     
     print(f"   {stats['total']} files: {stats['cached']} cached, {stats['hashed']} hashed")
+    if verify:
+        print(f"   Verified full-content hashes: {stats['collisions']} fingerprint collisions")
+    print(f"   Walk {walk_seconds:.2f}s, stat + hash {scan_seconds:.2f}s ({SCAN_WORKERS} threads)")
     
     return discovered
 
@@ -177,35 +358,17 @@ def load_index_state() -> Dict:
                 }
             },
             "total_chunks": 167767,
+            "faiss_rows": 167767,  # Rows covered by faiss.index on disk
             "total_books": 290,
             "last_updated": 1234567890.0
         }
     """
-    if not INDEX_STATE_PATH.exists():
-        return {
-            "file_cache": {},
-            "books": {},
-            "total_chunks": 0,
-            "total_books": 0,
-            "last_updated": 0
-        }
-    
-    with open(INDEX_STATE_PATH) as f:
-        state = json.load(f)
-        # Ensure file_cache exists (migration from old format)
-        if "file_cache" not in state:
-            state["file_cache"] = {}
-        return state
+    return get_state_store().load()
 
 
 def save_index_state(state: Dict):
-    """Atomically save index state."""
-    temp = tempfile.NamedTemporaryFile("w", delete=False, dir=LIBRARY_ROOT)
-    json.dump(state, temp, indent=2)
-    temp.flush()
-    os.fsync(temp.fileno())
-    temp.close()
-    os.replace(temp.name, INDEX_STATE_PATH)
+    """Persist index state (only rows changed since the last load/save)."""
+    get_state_store().save(state)
 
 
 def compute_diff(current_fs: Dict, index_state: Dict) -> Dict:
@@ -255,9 +418,102 @@ def move_to_no_indexing(book_path: Path, reason: str):
         print(f" ❌ {e}")
 
 
+def extract_book(path: str, filetype: str) -> Dict:
+    """
+    Extract paragraphs + chunk ONE book (extraction worker).
+    
+    Runs in a worker process: no model, no printing, no file moves.
+    The consumer decides what to do with failures.
+    
+    Returns:
+        {"chunks": [...]} or {"error": "reason"}
+    """
+    file_path = Path(path)
+    
+    # Extract + chunk (EPUB paragraphs are streamed straight into chunking)
+    try:
+        if filetype == 'epub':
+            paragraphs = iter_epub_paragraphs(file_path)
+        elif filetype == 'pdf':
+            paragraphs = extract_pdf_paragraphs(file_path)
+        else:
+            return {"error": f"Unsupported: {filetype}"}
+        
+        chunks = chunk_paragraphs(paragraphs, max_chars=1024)
+    except Exception as e:
+        return {"error": f"Extraction failed: {e}"}
+    
+    # Every paragraph lands in a chunk: no chunks = no paragraphs
+    if not chunks:
+        return {"error": "No paragraphs"}
+    
+    return {"chunks": chunks}
+
+
+def iter_extracted(jobs: List[Tuple[str, Dict]], workers: int = EXTRACT_WORKERS):
+    """
+    Producer: run extract_book over `jobs` on a process pool.
+    
+    Yields (book_hash, extracted) in completion order. At most
+    2 × workers books are in flight, so memory stays bounded while
+    the consumer (embedding) catches up.
+    
+    If a worker dies (e.g. native crash in a parser), the books still
+    in flight are yielded with {"retry": True} and the rest are left
+    for the next run — nothing is quarantined for a crash we can't pin
+    on a specific book.
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        for book_hash, file_entry in jobs:
+            yield book_hash, extract_book(file_entry["path"], file_entry["filetype"])
+        return
+    
+    queue = deque(jobs)
+    broken = False
+    
+    # Pool starts (forks) before the embedding model is loaded
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        pending = {}
+        
+        def fill():
+            while queue and len(pending) < workers * 2:
+                book_hash, file_entry = queue.popleft()
+                future = pool.submit(extract_book, file_entry["path"], file_entry["filetype"])
+                pending[future] = book_hash
+        
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                book_hash = pending.pop(future)
+                try:
+                    extracted = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    extracted = {"error": "Extraction worker crashed", "retry": True}
+                except Exception as e:
+                    extracted = {"error": f"Extraction failed: {e}"}
+                yield book_hash, extracted
+            if not broken:
+                fill()
+    
+    if queue:
+        print(f"   ⚠️  Extraction pool crashed, {len(queue)} books left for next run")
+
+
 def process_book(book_hash: str, file_entry: Dict) -> Optional[Dict]:
     """
-    Extract paragraphs, chunk, embed for ONE book.
+    Extract paragraphs, chunk, embed for ONE book (serial path).
+    """
+    extracted = extract_book(file_entry["path"], file_entry["filetype"])
+    return embed_book(book_hash, file_entry, extracted)
+
+
+def embed_book(book_hash: str, file_entry: Dict, extracted: Dict) -> Optional[Dict]:
+    """
+    Embed ONE extracted book (consumer side, owns the model).
+    
+    Quarantines books whose extraction failed.
     
     Returns:
         {
@@ -266,84 +522,121 @@ def process_book(book_hash: str, file_entry: Dict) -> Optional[Dict]:
                 {
                     "chunk_id": "ch_...",
                     "text": "...",
-                    "source": {...},
-                    "embedding": [...]
+                    "source": {...}
                 }
-            ]
+            ],
+            "embeddings": np.ndarray  # float32, one row per chunk
         }
         or None if failed
     """
     file_path = Path(file_entry["path"])
-    filetype = file_entry["filetype"]
     
     print(f"   Processing: {file_path.name}...", end='', flush=True)
     
-    # Extract paragraphs
-    try:
-        if filetype == 'epub':
-            paragraphs = extract_epub_paragraphs(file_path)
-        elif filetype == 'pdf':
-            paragraphs = extract_pdf_paragraphs(file_path)
-        else:
-            move_to_no_indexing(file_path, f"Unsupported: {filetype}")
-            return None
-    except Exception as e:
-        move_to_no_indexing(file_path, f"Extraction failed: {e}")
+    if extracted.get("retry"):
+        print(f" ⚠️  {extracted['error']} (will retry next run)")
         return None
     
-    if not paragraphs:
-        move_to_no_indexing(file_path, "No paragraphs")
+    if "error" in extracted:
+        move_to_no_indexing(file_path, extracted["error"])
         return None
     
-    # Chunk
-    chunks = chunk_paragraphs(paragraphs, max_chars=1024)
-    if not chunks:
-        move_to_no_indexing(file_path, "No chunks")
-        return None
+    chunks = extracted["chunks"]
     
-    # Embed
-    model = get_embed_model()
-    chunk_objects = []
+    # Embed (batched)
+    texts = [chunk["text"] for chunk in chunks]
+    embeddings, kept = embed_texts(texts)
     
-    for chunk in chunks:
-        chunk_id = f"ch_{uuid.uuid4().hex[:12]}"
-        text = chunk["text"]
-        
-        try:
-            embedding = model.encode(text, convert_to_numpy=True)
-        except Exception as e:
-            print(f" ⚠️  Embedding failed: {e}")
-            continue
-        
+    chunk_objects = []
+    for i in kept:
+        chunk = chunks[i]
         chunk_objects.append({
-            "chunk_id": chunk_id,
+            "chunk_id": f"ch_{uuid.uuid4().hex[:12]}",
             "book_hash": book_hash,
-            "text": text,
+            "text": chunk["text"],
             "source": chunk["source"],
-            "paragraphs": chunk["paragraphs"],
-            "embedding": embedding.tolist()
+            "paragraphs": chunk["paragraphs"]
         })
     
     print(f" ✓ {len(chunk_objects)} chunks")
     
     return {
         "book_hash": book_hash,
-        "chunks": chunk_objects
+        "chunks": chunk_objects,
+        "embeddings": embeddings
     }
 
 
-# ============================================================================
-# FAISS OPERATIONS (append-only)
-# ============================================================================
+def embed_texts(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> Tuple[np.ndarray, List[int]]:
+    """
+    Embed texts, consulting the embedding cache before the model.
+    
+    Only cache misses reach the model (see encode_batches); their vectors
+    are written back to the cache.
+    
+    Returns:
+        (embeddings, kept)
+        embeddings: float32 array, shape (len(kept), EMBEDDING_DIM)
+        kept: indices into `texts` that embedded successfully (row order)
+    """
+    cache = get_embedding_cache()
+    embeddings, missing = cache.get_many(texts)
+    
+    if not missing:
+        return embeddings, list(range(len(texts)))
+    
+    new_embeddings, new_kept = encode_batches([texts[i] for i in missing], batch_size)
+    new_rows = [missing[j] for j in new_kept]
+    embeddings[new_rows] = new_embeddings
+    cache.put_many([texts[i] for i in new_rows], new_embeddings)
+    
+    failed = set(missing) - set(new_rows)
+    kept = [i for i in range(len(texts)) if i not in failed]
+    return embeddings[kept], kept
+
 
-def append_to_faiss(new_chunks: List[Dict], state: Dict) -> faiss.Index:
+def encode_batches(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> Tuple[np.ndarray, List[int]]:
     """
-    Append new embeddings to FAISS index (or create if missing).
+    Embed texts in batches of `batch_size` (one model call per batch).
+    
+    Failure isolation: if a batch fails, its texts are retried one by one,
+    so a bad chunk only drops itself.
     
     Returns:
-        Updated FAISS index
+        (embeddings, kept) — same contract as embed_texts
     """
-    # Load existing index or create new
+    model = get_model(remote=True)
+    embeddings = np.empty((len(texts), EMBEDDING_DIM), dtype="float32")
+    kept = []
+    
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        try:
+            vectors = model.encode(batch, batch_size=batch_size, convert_to_numpy=True)
+            embeddings[len(kept):len(kept) + len(batch)] = vectors
+            kept.extend(range(start, start + len(batch)))
+            continue
+        except Exception as e:
+            print(f" ⚠️  Batch embedding failed ({e}), retrying per chunk")
+        
+        for i, text in enumerate(batch, start=start):
+            try:
+                vector = model.encode(text, convert_to_numpy=True)
+            except Exception as e:
+                print(f" ⚠️  Embedding failed: {e}")
+                continue
+            embeddings[len(kept)] = vector
+            kept.append(i)
+    
+    return embeddings[:len(kept)], kept
+
+
+# ============================================================================
+# FAISS OPERATIONS (append-only)
+# ============================================================================
+
+def load_faiss_index() -> faiss.Index:
+    """Load the FAISS index from disk (or create an empty one)."""
     if FAISS_INDEX_PATH.exists():
         print(f"   Loading existing FAISS index...")
         index = faiss.read_index(str(FAISS_INDEX_PATH))
@@ -351,33 +644,92 @@ def append_to_faiss(new_chunks: List[Dict], state: Dict) -> faiss.Index:
     else:
         print(f"   Creating new FAISS index...")
         index = faiss.IndexFlatIP(EMBEDDING_DIM)
+    return index
+
+
+def append_to_faiss(
+    embeddings: np.ndarray,
+    state: Dict,
+    index: Optional[faiss.Index] = None
+) -> faiss.Index:
+    """
+    Append new embeddings to FAISS index (or create if missing).
+    
+    Args:
+        embeddings: float32 array (n, EMBEDDING_DIM), normalized in place
+        index: Index already in memory (None = load from disk)
+    
+    Returns:
+        Updated FAISS index
+    """
+    if index is None:
+        index = load_faiss_index()
     
-    if not new_chunks:
+    if len(embeddings) == 0:
         return index
     
-    # Prepare embeddings
-    embeddings = np.array([c["embedding"] for c in new_chunks], dtype="float32")
+    # Prepare embeddings (FAISS needs contiguous float32)
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
     faiss.normalize_L2(embeddings)
     
     # Append to index
     start_offset = index.ntotal
     index.add(embeddings)
     
-    print(f"   ✓ Appended {len(new_chunks)} vectors ({start_offset:,} → {index.ntotal:,})")
+    print(f"   ✓ Appended {len(embeddings)} vectors ({start_offset:,} → {index.ntotal:,})")
     
-    return index
+    return maybe_upgrade_index(index)
 
 
-def save_faiss_and_metadata(index: faiss.Index, all_chunks: List[Dict], state: Dict):
-    """Save FAISS index + metadata atomically."""
-    print(f"\n   Saving FAISS index...")
+def maybe_upgrade_index(index: faiss.Index) -> faiss.Index:
+    """
+    Switch to the configured ANN index once the library is big enough.
     
-    # 1. FAISS index
-    temp_index = tempfile.NamedTemporaryFile(delete=False, dir=LIBRARY_ROOT)
-    faiss.write_index(index, temp_index.name)
-    os.replace(temp_index.name, FAISS_INDEX_PATH)
+    Flat stays exact and fast below ANN_THRESHOLD. Above it, vectors are
+    reconstructed from the current index (no re-embedding), the new index
+    is trained on a sample and refilled. Later runs just append to it.
+    """
+    if FAISS_INDEX_TYPE not in INDEX_TYPES:
+        raise ValueError(f"FAISS_INDEX_TYPE must be one of {INDEX_TYPES}, got {FAISS_INDEX_TYPE!r}")
     
-    # 2. Metadata (chunks without embeddings + book info)
+    current = index_kind(index)
+    if current == FAISS_INDEX_TYPE or index.ntotal < ANN_THRESHOLD:
+        return index
+    
+    print(f"   Rebuilding FAISS index: {current} → {FAISS_INDEX_TYPE} ({index.ntotal:,} vectors)...")
+    start = time.time()
+    upgraded = build_index(FAISS_INDEX_TYPE, read_vectors(index))
+    print(f"   ✓ {type(upgraded).__name__} ready in {time.time() - start:.1f}s")
+    
+    return upgraded
+
+
+def truncate_index(index: faiss.Index, rows: int) -> faiss.Index:
+    """Drop vectors [rows, ntotal) (rebuilds index types without remove_ids)."""
+    try:
+        index.remove_ids(faiss.IDSelectorRange(rows, index.ntotal))
+    except RuntimeError:
+        index = build_index(index_kind(index), read_vectors(index)[:rows])
+    return index
+
+
+def write_index_file(index: faiss.Index, path: Path):
+    """Write a FAISS index to `path` via a fsynced temp file (atomic rename)."""
+    temp_index = tempfile.NamedTemporaryFile(delete=False, dir=path.parent)
+    temp_index.close()
+    faiss.write_index(index, temp_index.name)
+    with open(temp_index.name, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(temp_index.name, path)
+
+
+def notify_mcp():
+    """Ask a running MCP server to reload the index (same signal as the watcher)."""
+    subprocess.run(["pkill", "-HUP", "-f", "mcp_server_faiss.py"], check=False)
+
+
+def build_books_meta(state: Dict) -> List[Dict]:
+    """Book table for the chunk store (id → title/path)."""
     books_meta = []
     for book_hash, book_info in state["books"].items():
         books_meta.append({
@@ -387,36 +739,169 @@ def save_faiss_and_metadata(index: faiss.Index, all_chunks: List[Dict], state: D
             "path": book_info["path"],
             "chunk_count": book_info["chunk_count"]
         })
+    return books_meta
+
+
+def save_faiss_index(index: faiss.Index, store: ChunkStore, state: Dict):
+    """
+    Write the FAISS index (once per run) and release the checkpoint vectors.
     
-    metadata = {
-        "books": books_meta,
-        "chunks": [
-            {k: v for k, v in c.items() if k != "embedding"}
-            for c in all_chunks
-        ]
-    }
-    
-    temp_meta = tempfile.NamedTemporaryFile("w", delete=False, dir=LIBRARY_ROOT)
-    json.dump(metadata, temp_meta, indent=2)
-    temp_meta.flush()
-    os.fsync(temp_meta.fileno())
-    temp_meta.close()
-    os.replace(temp_meta.name, METADATA_PATH)
+    state["faiss_rows"] records the rows the index covers (lets the next
+    run skip loading it, see recover_interrupted_run). The .vec files are
+    only dropped once the fsynced index covers their rows.
+    """
+    print(f"\n   Saving FAISS index...")
+    write_index_file(index, FAISS_INDEX_PATH)
+    state["faiss_rows"] = index.ntotal
+    save_index_state(state)
+    store.drop_vectors()
     
     faiss_size = FAISS_INDEX_PATH.stat().st_size / 1024 / 1024
-    meta_size = METADATA_PATH.stat().st_size / 1024 / 1024
+    store_size = store.size_bytes() / 1024 / 1024
     
     print(f"   ✓ FAISS: {faiss_size:.1f} MB")
-    print(f"   ✓ Metadata: {meta_size:.1f} MB")
+    print(f"   ✓ Chunk store: {store_size:.1f} MB ({len(store):,} chunks)")
+
+
+def checkpoint(
+    index: Optional[faiss.Index],
+    chunks: List[Dict],
+    embeddings: List[np.ndarray],
+    state: Dict,
+    tombstones: Optional[List[List[int]]] = None
+) -> faiss.Index:
+    """
+    Durably commit a batch of new books: chunk records + vectors, then state.
+    
+    The batch becomes one chunk store segment whose .vec file holds its
+    normalized vectors (O(batch) disk writes). The FAISS index is only
+    appended to in memory; save_faiss_index writes it once at the end of
+    the run, and recover_interrupted_run rebuilds its tail from the .vec
+    files after a crash. Commit order is chunk store → index state, so
+    state never has books without their rows.
+    
+    Args:
+        index: FAISS index in memory (None = load from disk)
+        chunks: Chunk records of the batch (row order = embeddings)
+        embeddings: Per-book embedding arrays of the batch
+        tombstones: Row ranges of deleted books to commit with it
+    
+    Returns:
+        Updated FAISS index (keep passing it to the next checkpoint)
+    """
+    vectors = np.ascontiguousarray(np.vstack(embeddings), dtype="float32")
+    faiss.normalize_L2(vectors)
+    
+    # 1. Chunk store: new segment (records + vectors) + book table, one manifest commit
+    ChunkStore(CHUNK_STORE_DIR).append(
+        chunks, books=build_books_meta(state), tombstones=tombstones, vectors=vectors
+    )
+    
+    # 2. FAISS (memory only)
+    index = append_to_faiss(vectors, state, index)
+    
+    # 3. State
+    state["total_chunks"] = index.ntotal
+    state["total_books"] = len(state["books"])
+    state["last_updated"] = time.time()
+    save_index_state(state)
+    return index
+
+
+def recover_interrupted_run(state: Dict, store: ChunkStore) -> Optional[faiss.Index]:
+    """
+    Bring FAISS, chunk store and state back in line after a crashed run.
+    
+    - A compaction that reached its commit point is finished (see compact).
+    - Rows checkpointed after the last FAISS write (crash before the end of
+      the run) get their vectors back from the segments' .vec files. If a
+      .vec file is missing, the run aborts: appending would misalign FAISS
+      rows and chunk store rows.
+    - Vectors past the end of the chunk store (crash between the FAISS and
+      chunk store writes of runs before .vec files) are dropped.
+    - Rows past state["total_chunks"] (crash before the state save) belong
+      to no book: they are tombstoned, their books are indexed again
+      (embedding cache hits, no inference).
+    - Books whose chunk_range lies past the committed rows (state saved
+      ahead of its vectors, as checkpoints before resumable indexing did)
+      are forgotten, so they are indexed again.
+    
+    The FAISS index is only read when state["faiss_rows"] (rows covered by
+    the last FAISS write) disagrees with the chunk store, so a run with
+    nothing to repair doesn't pay a full index load.
+    
+    Returns:
+        The FAISS index if it had to be loaded/repaired, else None
+        (checkpoint loads it when there is something to append)
+    
+    Raises:
+        ValueError: FAISS is behind the chunk store and can't be caught up
+    """
+    if COMPACTION_MARKER_PATH.exists():
+        print("   ♻️  Finishing an interrupted compaction")
+    finish_compaction(state, store)
+    
+    rows = len(store)
+    index = None
+    in_line = state.get("faiss_rows") == rows and (rows == 0 or FAISS_INDEX_PATH.exists())
+    if not in_line and (rows or FAISS_INDEX_PATH.exists()):
+        index = load_faiss_index()
+    
+    if index is not None and index.ntotal < rows:
+        try:
+            vectors = store.read_vectors(index.ntotal, rows)
+        except FileNotFoundError:
+            raise ValueError(
+                f"FAISS has {index.ntotal:,} vectors for {rows:,} chunks and the "
+                f"checkpoint vectors are gone, run a full rebuild"
+            )
+        print(f"   ♻️  Restoring {rows - index.ntotal:,} vectors of an interrupted run")
+        index = append_to_faiss(vectors, state, index)
+        save_faiss_index(index, store, state)
+    
+    if index is not None and index.ntotal > rows:
+        print(f"   ♻️  Dropping {index.ntotal - rows:,} vectors of an interrupted checkpoint")
+        index = truncate_index(index, rows)
+        save_faiss_index(index, store, state)
+    
+    if index is not None and state.get("faiss_rows") != index.ntotal:
+        state["faiss_rows"] = index.ntotal  # State written before faiss_rows existed
+        save_index_state(state)
+    
+    store.drop_vectors()  # Left over if the run died between saving FAISS and dropping them
+    
+    unflushed = [
+        book_hash for book_hash, book in state["books"].items()
+        if book["chunk_range"][1] > rows
+    ]
+    for book_hash in unflushed:
+        del state["books"][book_hash]
+    if unflushed:
+        print(f"   ♻️  {len(unflushed)} books were checkpointed without their vectors, re-indexing")
+    
+    orphaned = [] if state["total_chunks"] >= rows else [[state["total_chunks"], rows]]
+    if orphaned:
+        print(f"   ♻️  Tombstoning {rows - state['total_chunks']:,} rows of an interrupted checkpoint")
+    
+    if unflushed or orphaned or state["total_chunks"] != rows:
+        state["total_chunks"] = rows
+        state["total_books"] = len(state["books"])
+        store.write_books(build_books_meta(state), orphaned)
+        save_index_state(state)
+    
+    return index
 
 
 # ============================================================================
 # MAIN INCREMENTAL INDEXER
 # ============================================================================
 
-def index_incremental():
+def index_incremental(verify: bool = VERIFY_HASHES):
     """
     Incremental indexer: O(Δ new books), not O(N total books).
+    
+    Args:
+        verify: Check sampled identities against full-content hashes
     """
     print("\n🚀 Incremental indexer (folder-agnostic, content-addressed)")
     
@@ -425,9 +910,16 @@ def index_incremental():
     state = load_index_state()
     print(f"   Indexed: {state['total_books']} books, {state['total_chunks']:,} chunks")
     
+    store = ChunkStore(CHUNK_STORE_DIR)
+    if migrate_metadata_json(METADATA_PATH, store):
+        print(f"   Migrated metadata.json → chunk store ({len(store):,} chunks)")
+    index = recover_interrupted_run(state, store)
+    
     # 2. Discover current filesystem state (with fingerprint caching)
     print("\n📁 Scanning filesystem...")
-    current_fs = scan_filesystem(state)  # Pass state for cache access
+    previous_file_cache = state.get("file_cache", {})
+    current_fs = scan_filesystem(state, verify)  # Pass state for cache access
+    file_cache_changed = state["file_cache"] != previous_file_cache
     print(f"   Found {len(current_fs)} books on disk")
     
     # 3. Compute diff
@@ -446,29 +938,39 @@ def index_incremental():
         save_index_state(state)
     
     # 5. Handle deleted files
+    tombstones = []
     if diff["deleted"]:
         print(f"\n🗑️  Removing {len(diff['deleted'])} deleted books from index...")
         for book_hash in diff["deleted"]:
-            del state["books"][book_hash]
-        # Note: FAISS vectors stay (append-only), but metadata removed
-        # Full rebuild needed to reclaim space (rare operation)
+            book = state["books"].pop(book_hash)
+            tombstones.append(book["chunk_range"])
+        # FAISS vectors stay (append-only) but are tombstoned: search skips them,
+        # `indexer_v6.py compact` reclaims the space
     
     # 6. Process NEW books only
     if not diff["new"]:
         print("\n✅ No new books to index")
         if diff["moved"] or diff["deleted"]:
+            state["total_books"] = len(state["books"])
+            store.write_books(build_books_meta(state), tombstones)
             save_index_state(state)
+        elif file_cache_changed:
+            save_index_state(state)  # Keep fresh hashes (next scan takes the fast path)
         return
     
     print(f"\n🆕 Processing {len(diff['new'])} new books...")
     
-    new_chunks_all = []
-    chunk_offset = state["total_chunks"]
+    pending_chunks = []
+    pending_embeddings = []
+    chunk_offset = first_row = state["total_chunks"]
     processed_count = 0
     
-    for book_hash in diff["new"]:
+    # Producer (extraction pool) → single consumer (embedding model)
+    jobs = [(book_hash, current_fs[book_hash]) for book_hash in diff["new"]]
+    
+    for book_hash, extracted in iter_extracted(jobs):
         file_entry = current_fs[book_hash]
-        result = process_book(book_hash, file_entry)
+        result = embed_book(book_hash, file_entry, extracted)
         
         if result:
             chunks = result["chunks"]
@@ -483,47 +985,170 @@ def index_incremental():
             }
             
             chunk_offset += chunk_count
-            new_chunks_all.extend(chunks)
+            pending_chunks.extend(chunks)
+            pending_embeddings.append(result["embeddings"])
             processed_count += 1
             
-            # CHECKPOINT: Save every 10 books (resumable on crash)
-            if processed_count % 10 == 0:
+            # CHECKPOINT: commit vectors + chunks + state (resumable on crash)
+            if processed_count % CHECKPOINT_BOOKS == 0:
                 print(f"   ✅ Checkpoint: {processed_count}/{len(diff['new'])} books processed")
-                save_index_state(state)
+                index = checkpoint(index, pending_chunks, pending_embeddings, state, tombstones)
+                pending_chunks, pending_embeddings, tombstones = [], [], []
     
-    if not new_chunks_all:
+    if chunk_offset == first_row:
         print("\n⚠️  No valid chunks from new books")
+        if diff["moved"] or diff["deleted"]:
+            state["total_books"] = len(state["books"])
+            store.write_books(build_books_meta(state), tombstones)
+            save_index_state(state)
         return
     
-    # 7. Append to FAISS
-    print(f"\n➕ Appending {len(new_chunks_all)} new chunks to FAISS...")
+    # 7. Commit the last partial batch (append to FAISS, existing chunks are never loaded)
+    if pending_embeddings:
+        print(f"\n➕ Appending {len(pending_chunks)} new chunks to FAISS...")
+        index = checkpoint(index, pending_chunks, pending_embeddings, state, tombstones)
     
-    # Load all existing chunks (needed for metadata.json)
-    if METADATA_PATH.exists():
-        with open(METADATA_PATH) as f:
-            existing_meta = json.load(f)
-            all_chunks = existing_meta.get("chunks", [])
-    else:
-        all_chunks = []
+    # 8. FAISS index: written once for the whole run
+    save_faiss_index(index, ChunkStore(CHUNK_STORE_DIR), state)
+    
+    print(f"\n✅ Index updated")
+    print(f"   Total books: {state['total_books']}")
+    print(f"   Total chunks: {state['total_chunks']:,}")
+    if embedding_cache is not None:
+        print(f"   Embedding cache: {embedding_cache.hits:,} hits, {embedding_cache.misses:,} embedded")
+
+
+# ============================================================================
+# COMPACTION (reclaim tombstoned vectors)
+# ============================================================================
+
+def compact():
+    """
+    Rebuild FAISS index + chunk store without dead rows (no re-embedding).
+    
+    Live rows = the chunk_range of every book still in state. Vectors are
+    reconstructed from the current index (lossy for ivfpq), chunk records
+    are streamed from the current store into one new segment, and every
+    chunk_range is remapped to its new position.
+    
+    Crash-safe: the new index and segment are written under temporary
+    names, then COMPACTION_MARKER_PATH commits the compaction. Switching
+    FAISS, chunk store and state over happens in finish_compaction, which
+    the next run repeats if it was interrupted. Without the marker, the
+    temporary files are discarded and nothing changed.
+    """
+    print("\n🧹 Compacting index (dropping tombstoned vectors)")
+    
+    state = load_index_state()
+    store = ChunkStore(CHUNK_STORE_DIR)
+    
+    if not FAISS_INDEX_PATH.exists():
+        print("\n⚠️  No FAISS index to compact")
+        return
+    
+    recover_interrupted_run(state, store)
+    index = faiss.read_index(str(FAISS_INDEX_PATH))
+    if index.ntotal != len(store):
+        raise ValueError(f"Index/chunk store mismatch: {index.ntotal} vectors != {len(store)} chunks")
+    
+    # 1. Live rows, in current row order (keeps FAISS/store alignment)
+    books_by_start = sorted(state["books"].items(), key=lambda item: item[1]["chunk_range"][0])
+    live_rows = []
+    chunk_ranges = {}
+    for book_hash, book in books_by_start:
+        start, end = book["chunk_range"]
+        chunk_ranges[book_hash] = [len(live_rows), len(live_rows) + (end - start)]
+        live_rows.extend(range(start, end))
+    
+    dead = index.ntotal - len(live_rows)
+    print(f"   {index.ntotal:,} vectors → {len(live_rows):,} live ({dead:,} dead)")
+    
+    if dead == 0:
+        print("\n✅ Nothing to compact")
+        return
+    
+    # 2. New FAISS index from surviving vectors (temporary name)
+    vectors = read_vectors(index)[live_rows] if live_rows else np.empty((0, index.d), dtype="float32")
+    kind = FAISS_INDEX_TYPE if len(live_rows) >= ANN_THRESHOLD else "flat"
+    compacted = build_index(kind, vectors)
+    del vectors
+    write_index_file(compacted, COMPACT_INDEX_PATH)
+    
+    # 3. New segment (written, not committed)
+    segment = store.stage_segment(store.get(row) for row in live_rows)
+    
+    # 4. Commit point: from here on the compaction is finished, even after a crash
+    marker = {
+        "segment": segment,
+        "old_segments": [seg["name"] for seg in store.manifest()["segments"]],
+        "chunk_ranges": chunk_ranges
+    }
+    temp = tempfile.NamedTemporaryFile("w", delete=False, dir=LIBRARY_ROOT)
+    json.dump(marker, temp)
+    temp.flush()
+    os.fsync(temp.fileno())
+    temp.close()
+    os.replace(temp.name, COMPACTION_MARKER_PATH)
+    
+    # 5. Switch FAISS → chunk store → state, drop old segments, reload the MCP server
+    finish_compaction(state, store)
+    notify_mcp()
+    
+    print(f"\n✅ Compacted: {compacted.ntotal:,} vectors ({type(compacted).__name__})")
+
+
+def finish_compaction(state: Dict, store: ChunkStore):
+    """
+    Complete a committed compaction (COMPACTION_MARKER_PATH), or discard
+    the temporary files of one that never reached its commit point.
+    
+    Every step is idempotent, so a crash in here is finished by the next run.
+    """
+    if not COMPACTION_MARKER_PATH.exists():
+        COMPACT_INDEX_PATH.unlink(missing_ok=True)
+        return
     
-    # Add new chunks
-    all_chunks.extend(new_chunks_all)
+    with open(COMPACTION_MARKER_PATH) as f:
+        marker = json.load(f)
     
-    # Append to FAISS
-    index = append_to_faiss(new_chunks_all, state)
+    # 1. FAISS (already switched if the temp file is gone)
+    if COMPACT_INDEX_PATH.exists():
+        os.replace(COMPACT_INDEX_PATH, FAISS_INDEX_PATH)
     
-    # 8. Save everything
-    state["total_chunks"] = len(all_chunks)
+    # 2. State ranges, then chunk store (book table is built from state)
+    for book_hash, chunk_range in marker["chunk_ranges"].items():
+        if book_hash in state["books"]:
+            state["books"][book_hash]["chunk_range"] = chunk_range
+    
+    store.close()
+    store.commit_replacement(marker["segment"], build_books_meta(state), marker["old_segments"])
+    
+    # 3. State
+    state["total_chunks"] = state["faiss_rows"] = marker["segment"]["rows"]
     state["total_books"] = len(state["books"])
     state["last_updated"] = time.time()
-    
-    save_faiss_and_metadata(index, all_chunks, state)
     save_index_state(state)
     
-    print(f"\n✅ Index updated")
-    print(f"   Total books: {state['total_books']}")
-    print(f"   Total chunks: {state['total_chunks']:,}")
+    COMPACTION_MARKER_PATH.unlink()
+
+
+def main():
+    """Main entry point."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Librarian Indexer v6")
+    parser.add_argument('command', nargs='?', default='index', choices=['index', 'compact'],
+                        help="index: incremental update (default), compact: drop deleted books' vectors")
+    parser.add_argument('--verify', action='store_true', default=VERIFY_HASHES,
+                        help="also hash full file contents to detect fingerprint collisions (slow, reads every file)")
+    
+    args = parser.parse_args()
+    
+    if args.command == 'compact':
+        compact()
+    else:
+        index_incremental(verify=args.verify)
 
 
 if __name__ == "__main__":
-    index_incremental()
+    main()
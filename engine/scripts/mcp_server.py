@@ -14,20 +14,30 @@ import os
 import sys
 import json
 import time
+import signal
 import logging
 from pathlib import Path
 from typing import List, Dict, Optional
-from threading import Thread, Lock
+from threading import Thread, Event
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    HAS_WATCHDOG = True
+except ImportError:
+    HAS_WATCHDOG = False
+
 # Add engine/scripts to path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from cluster_selection import cluster_aware_search
 from search import search_library
+from embedding_service import warm_up
+from tool_executor import tool_executor
 from query_logger import log_query
 
 # Setup logging
@@ -41,71 +51,131 @@ app = Server("librarian-v3")
 LIBRARY_ROOT = Path(__file__).parent.parent.parent / "books"
 INDEX_PATH = LIBRARY_ROOT / ".global-index-v5.json"
 
+POLL_SECONDS = 2        # mtime polling interval (only without watchdog)
+RELOAD_DEBOUNCE = 0.5   # Seconds to let a burst of file events settle
+
 
 # ============================================================
 # Hot-Reload System (v4)
 # ============================================================
 
+def _index_version() -> Optional[tuple]:
+    """(mtime_ns, size) of the index file, None if missing."""
+    try:
+        stat = INDEX_PATH.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
 class IndexReloader:
     """
-    Hot-reload index when file changes (mtime-based).
+    Hot-reload index when the file changes (event-driven).
     
-    Background thread polls mtime every 2s.
-    On change: reload index atomically.
+    Reload triggers:
+    - Filesystem events on INDEX_PATH (watchdog → inotify on Linux),
+      including the atomic os.replace the indexers use
+    - A notification from the indexer: SIGHUP (`pkill -HUP -f mcp_server.py`)
+      or request_reload() in-process
+    - Without watchdog: mtime polling every POLL_SECONDS
+    
+    The reload thread parses the new index with no lock held and publishes
+    it with a single reference swap: get_index() never waits on a reload,
+    and readers keep the generation they already hold.
     
     Zero downtime, always fresh index.
     """
     
     def __init__(self):
         self.index = None
-        self.lock = Lock()
-        self.last_mtime = 0
+        self.version = None
+        self.generation = 0
+        self._reload_requested = Event()
         self.load_index()
         
-        # Start background reload thread
-        self.thread = Thread(target=self.watch_loop, daemon=True)
+        # Start background reload thread (+ file watcher)
+        self.observer = self.start_observer()
+        self.thread = Thread(target=self.reload_loop, name="index-reload", daemon=True)
         self.thread.start()
-        logger.info("[IndexReloader] Hot-reload enabled (mtime-based, 2s poll)")
+        if self.observer is not None:
+            logger.info(f"[IndexReloader] Hot-reload enabled (file events on {INDEX_PATH.name}, SIGHUP)")
+        else:
+            logger.info(f"[IndexReloader] Hot-reload enabled (mtime-based, {POLL_SECONDS}s poll, SIGHUP)")
     
     def load_index(self):
-        """Load index from disk (thread-safe)."""
-        with self.lock:
-            try:
-                with open(INDEX_PATH) as f:
-                    self.index = json.load(f)
-                self.last_mtime = INDEX_PATH.stat().st_mtime
-                total_books = self.index.get('total_books', 0)
-                total_chunks = self.index.get('total_chunks', 0)
-                logger.info(f"[IndexReloader] Loaded index: {total_books} books, {total_chunks} chunks")
-            except Exception as e:
-                logger.error(f"[IndexReloader] Failed to load index: {e}")
+        """Load index from disk and publish it (no lock: parse, then swap)."""
+        version = _index_version()
+        try:
+            with open(INDEX_PATH) as f:
+                index = json.load(f)
+        except Exception as e:
+            logger.error(f"[IndexReloader] Failed to load index: {e}")
+            if self.index is None:
                 self.index = {"books": [], "total_books": 0, "total_chunks": 0}
-                self.last_mtime = 0
+            return  # Keep serving the previous generation
+        
+        # Pointer swap (atomic): readers see the old or the new index, never a partial one
+        self.index = index
+        self.version = version
+        self.generation += 1
+        total_books = index.get('total_books', 0)
+        total_chunks = index.get('total_chunks', 0)
+        logger.info(f"[IndexReloader] Loaded index: {total_books} books, {total_chunks} chunks")
     
     def get_index(self):
-        """Get current index (thread-safe)."""
-        with self.lock:
-            return self.index
+        """Get current index (never blocks)."""
+        return self.index
     
-    def watch_loop(self):
-        """Background thread polling for mtime changes."""
+    def request_reload(self):
+        """Ask the reload thread to check the index file (returns immediately)."""
+        self._reload_requested.set()
+    
+    def start_observer(self):
+        """Watch LIBRARY_ROOT for index file events (None → polling)."""
+        if not HAS_WATCHDOG:
+            return None
+        
+        reloader = self
+        
+        class IndexFileHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                paths = (getattr(event, "src_path", None), getattr(event, "dest_path", None))
+                if str(INDEX_PATH) in paths:
+                    reloader.request_reload()
+        
+        try:
+            observer = Observer()
+            observer.daemon = True
+            observer.schedule(IndexFileHandler(), str(LIBRARY_ROOT), recursive=False)
+            observer.start()
+            return observer
+        except Exception as e:
+            logger.warning(f"[IndexReloader] File watching unavailable ({e}), polling instead")
+            return None
+    
+    def reload_loop(self):
+        """Background thread: reload when triggered (or on each poll without watchdog)."""
+        poll = None if self.observer is not None else POLL_SECONDS
         while True:
-            time.sleep(2)  # Poll every 2 seconds
+            if self._reload_requested.wait(timeout=poll):
+                # Let a burst of events (temp file, rename, ...) settle into one reload
+                time.sleep(RELOAD_DEBOUNCE)
+            self._reload_requested.clear()
             
             try:
-                current_mtime = INDEX_PATH.stat().st_mtime
-                if current_mtime > self.last_mtime:
-                    logger.info("[IndexReloader] Index file changed, reloading...")
-                    old_count = self.index.get('total_books', 0) if self.index else 0
-                    self.load_index()
-                    new_count = self.index.get('total_books', 0)
-                    delta = new_count - old_count
-                    if delta != 0:
-                        logger.info(f"[IndexReloader] Book count delta: {delta:+d} (now {new_count})")
-            except FileNotFoundError:
-                pass  # Index not created yet
+                version = _index_version()
+                if version is None or version == self.version:
+                    continue  # Not created yet / unchanged
+                
+                logger.info("[IndexReloader] Index file changed, reloading...")
+                old_count = self.index.get('total_books', 0) if self.index else 0
+                self.load_index()
+                new_count = self.index.get('total_books', 0)
+                delta = new_count - old_count
+                if delta != 0:
+                    logger.info(f"[IndexReloader] Book count delta: {delta:+d} (now {new_count})")
             except Exception as e:
-                logger.error(f"[IndexReloader] Watch error: {e}")
+                logger.error(f"[IndexReloader] Reload error: {e}")
 
 
 # Global index reloader
@@ -158,15 +228,15 @@ async def list_tools() -> List[Tool]:
 
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> List[TextContent]:
-    """Handle MCP tool calls."""
+    """Handle MCP tool calls (blocking handlers run on the tool executor)."""
     
     if name == "research_query":
-        return await handle_research_query(arguments)
+        return await tool_executor.run(handle_research_query, arguments)
     
     raise ValueError(f"Unknown tool: {name}")
 
 
-async def handle_research_query(args: dict) -> List[TextContent]:
+def handle_research_query(args: dict) -> List[TextContent]:
     """
     Handle research_query tool call.
     
@@ -322,6 +392,15 @@ async def main():
     """Run MCP server."""
     logger.info("Starting Librarian MCP Server v3...")
     
+    # Indexer notification: SIGHUP = reload index (on the reload thread)
+    signal.signal(signal.SIGHUP, lambda signum, frame: index_reloader.request_reload())
+    
+    # Load the embedding model before the first query needs it
+    try:
+        warm_up()
+    except Exception as e:
+        logger.warning(f"Embedding warm-up failed (will load on first query): {e}")
+    
     async with stdio_server() as (read_stream, write_stream):
         await app.run(read_stream, write_stream, app.create_initialization_options())
 
@@ -7,6 +7,7 @@ Zero legacy dependencies, single source of truth.
 
 MCP Tools:
     - search_library: Semantic search via FAISS
+    - search_library_batch: Several queries, one encode + one FAISS search
 
 Usage:
     python mcp_server.py
@@ -14,12 +15,13 @@ Usage:
 import os
 import sys
 import json
+import time
 import logging
 import signal
 import threading
+import urllib.parse
 from pathlib import Path
 from typing import List, Dict
-from sentence_transformers import SentenceTransformer
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
@@ -29,6 +31,9 @@ from mcp.types import Tool, TextContent
 sys.path.insert(0, str(Path(__file__).parent))
 
 from faiss_search import get_searcher
+from query_cache import query_cache
+from embedding_service import get_model, warm_up, serve_socket
+from tool_executor import tool_executor
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -39,42 +44,87 @@ app = Server("librarian-v5-faiss")
 
 # Paths
 FAISS_INDEX = Path("/app/books/faiss.index")
-METADATA_JSON = Path("/app/books/metadata.json")
-
-# Lazy-load embedding model & searcher
-_model = None
+CHUNK_STORE = Path("/app/books/chunks")
+
+# Lazy-load searcher (embedding model: embedding_service.get_model)
+#
+# Double-buffered: a reload builds the next searcher generation on a
+# background thread and swaps the _searcher reference. Queries grab the
+# reference once (get_search) and finish on the generation they started
+# with; the old one is freed when its last query returns.
 _searcher = None
-_searcher_lock = threading.Lock()  # T020: Thread-safe reload
-
-
-def get_model():
-    """Lazy-load embedding model (singleton)."""
-    global _model
-    if _model is None:
-        logger.info("Loading embedding model: BAAI/bge-small-en-v1.5")
-        _model = SentenceTransformer("BAAI/bge-small-en-v1.5")
-    return _model
+_searcher_lock = threading.Lock()  # First load only (readers never take it once loaded)
+_generation = 0
+_last_reload = None                # {"time", "seconds", "error"}
+_reload_requested = threading.Event()
 
 
 def get_search():
-    """Lazy-load FAISS searcher (singleton)."""
-    global _searcher
+    """Lazy-load FAISS searcher (current generation)."""
+    searcher = _searcher
+    if searcher is not None:
+        return searcher
+    
     with _searcher_lock:
         if _searcher is None:
             logger.info(f"Loading FAISS index from {FAISS_INDEX}")
-            _searcher = get_searcher(
+            swap_searcher(get_searcher(
                 index_path=str(FAISS_INDEX),
-                metadata_path=str(METADATA_JSON)
-            )
-            stats = _searcher.get_stats()
-            logger.info(
-                f"FAISS ready: {stats['total_books']} books, "
-                f"{stats['total_chunks']:,} chunks, "
-                f"{stats['dimensions']} dims"
-            )
+                store_path=str(CHUNK_STORE)
+            ))
     return _searcher
 
 
+def swap_searcher(searcher):
+    """Publish a loaded searcher as the current generation."""
+    global _searcher, _generation
+    _searcher = searcher
+    _generation += 1
+    
+    stats = searcher.get_stats()
+    logger.info(
+        f"FAISS ready (generation {_generation}): {stats['total_books']} books, "
+        f"{stats['total_chunks']:,} chunks, "
+        f"{stats['dimensions']} dims"
+    )
+
+
+def reload_loop():
+    """
+    Background reloader: waits for a reload request, loads the next
+    generation off the query path, then swaps it in.
+    
+    Requests arriving during a load are coalesced into one more reload.
+    """
+    global _last_reload
+    while True:
+        _reload_requested.wait()
+        _reload_requested.clear()
+        
+        logger.info("Reloading FAISS index...")
+        started = time.perf_counter()
+        try:
+            searcher = get_searcher(
+                index_path=str(FAISS_INDEX),
+                store_path=str(CHUNK_STORE),
+                reload=True
+            )
+        except Exception as e:
+            # Keep serving the current generation
+            logger.error(f"❌ Reload failed: {e}")
+            _last_reload = {"time": time.time(), "seconds": time.perf_counter() - started, "error": str(e)}
+            continue
+        
+        swap_searcher(searcher)
+        _last_reload = {"time": time.time(), "seconds": time.perf_counter() - started, "error": None}
+        logger.info(f"✅ FAISS reloaded in {_last_reload['seconds']:.1f}s")
+
+
+def request_reload():
+    """Ask the background reloader for a new generation (returns immediately)."""
+    _reload_requested.set()
+
+
 @app.list_tools()
 async def list_tools() -> List[Tool]:
     """List available MCP tools."""
@@ -109,6 +159,44 @@ async def list_tools() -> List[Tool]:
                 "required": ["query"]
             }
         ),
+        Tool(
+            name="search_library_batch",
+            description=(
+                "Run several related searches in one call (one embedding pass, one FAISS search). "
+                "Returns ranked results per query; optionally each chunk only once across queries."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "queries": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Search queries (natural language)",
+                        "minItems": 1,
+                        "maxItems": 20
+                    },
+                    "k": {
+                        "type": "integer",
+                        "description": "Number of results per query (default: 5)",
+                        "default": 5,
+                        "minimum": 1,
+                        "maximum": 50
+                    },
+                    "min_score": {
+                        "type": "number",
+                        "description": "Minimum similarity score (0-1, optional)",
+                        "minimum": 0.0,
+                        "maximum": 1.0
+                    },
+                    "dedupe": {
+                        "type": "boolean",
+                        "description": "Return each chunk once, under the query it matches best (default: false)",
+                        "default": False
+                    }
+                },
+                "required": ["queries"]
+            }
+        ),
         Tool(
             name="get_chunk",
             description="Retrieve specific chunk by ID (for follow-up or deep-dive).",
@@ -123,6 +211,23 @@ async def list_tools() -> List[Tool]:
                 "required": ["chunk_id"]
             }
         ),
+        Tool(
+            name="get_chunks",
+            description="Retrieve several chunks by ID in one call (follow up on multiple results).",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "chunk_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Chunk identifiers (e.g., ['ch_abc123', 'ch_def456'])",
+                        "minItems": 1,
+                        "maxItems": 50
+                    }
+                },
+                "required": ["chunk_ids"]
+            }
+        ),
         Tool(
             name="stats",
             description="Get library statistics (books, chunks, index size).",
@@ -136,21 +241,33 @@ async def list_tools() -> List[Tool]:
 
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> List[TextContent]:
-    """Handle MCP tool calls."""
+    """
+    Handle MCP tool calls.
+    
+    Handlers are blocking (model, FAISS, chunk store) and run on the
+    bounded tool executor, so one slow query does not stall other requests.
+    """
     
     if name == "search_library":
-        return await handle_search(arguments)
+        return await tool_executor.run(handle_search, arguments)
+    
+    elif name == "search_library_batch":
+        return await tool_executor.run(handle_search_batch, arguments)
     
     elif name == "get_chunk":
-        return await handle_get_chunk(arguments)
+        return await tool_executor.run(handle_get_chunk, arguments)
+    
+    elif name == "get_chunks":
+        return await tool_executor.run(handle_get_chunks, arguments)
     
     elif name == "stats":
-        return await handle_stats(arguments)
+        # Cheap: answered on the event loop even when all workers are busy
+        return handle_stats(arguments)
     
     raise ValueError(f"Unknown tool: {name}")
 
 
-async def handle_search(args: dict) -> List[TextContent]:
+def handle_search(args: dict) -> List[TextContent]:
     """
     Handle search_library tool call.
     
@@ -188,61 +305,112 @@ async def handle_search(args: dict) -> List[TextContent]:
     output = f"# Search Results: {query}\n\n"
     output += f"Found {len(results)} relevant chunks:\n\n"
 
-    import urllib.parse as _u
-
     for i, result in enumerate(results, 1):
-        score = result["score"]
-        book_title = result.get("book_title", "Unknown")
-        book_author = result.get("book_author", "Unknown")
-        text = result["text"]
-        chunk_id = result["chunk_id"]
-        book_id = result.get("book_id") or result.get("book_hash") or ""
-
-        # Source metadata
-        source = result.get("source", {})
-        source_type = source.get("type", "unknown")
-
-        # Build reader deep-link
-        # Use first ~60 chars of chunk text as locator (urlencoded).
-        # Strip leading whitespace/newlines from preview.
-        preview = text.strip().split("\n")[0][:60].strip()
-        t_param = _u.quote(preview)
-
-        if source_type == "epub":
-            spine_idx = source.get("spine_index", "?")
-            href = source.get("href", "")
-            location = f"spine {spine_idx}, {href}"
-            href_param = _u.quote(href)
-            reader_url = (
-                f"https://8088.nonlinear.nyc/book/{book_id}"
-                f"#href={href_param}&t={t_param}"
-            ) if book_id and href else (
-                f"https://8088.nonlinear.nyc/book/{book_id}" if book_id else ""
-            )
-        elif source_type == "pdf":
-            page = source.get("page", "?")
-            location = f"page {page}"
-            reader_url = (
-                f"https://8088.nonlinear.nyc/book/{book_id}#p={page}"
-            ) if book_id else ""
-        else:
-            location = "unknown location"
-            reader_url = f"https://8088.nonlinear.nyc/book/{book_id}" if book_id else ""
-
-        output += f"## {i}. {book_title} [{score:.3f}]\n\n"
-        output += f"**Author:** {book_author}  \n"
-        output += f"**Location:** {location}  \n"
-        output += f"**Chunk ID:** `{chunk_id}`  \n"
-        if reader_url:
-            output += f"**Reader:** {reader_url}  \n"
-        output += "\n"
-        output += f"> {text[:300]}{'...' if len(text) > 300 else ''}\n\n"
-        output += "---\n\n"
+        output += format_result(i, result)
 
     return [TextContent(type="text", text=output)]
 
 
-async def handle_get_chunk(args: dict) -> List[TextContent]:
+def handle_search_batch(args: dict) -> List[TextContent]:
+    """
+    Handle search_library_batch tool call.
+    
+    Args:
+        args: {queries, k, min_score, dedupe}
+    
+    Returns:
+        Formatted results, one section per query
+    """
+    queries = args.get("queries", [])
+    k = args.get("k", 5)
+    min_score = args.get("min_score")
+    dedupe = args.get("dedupe", False)
+    
+    logger.info(f"Batch search: {len(queries)} queries (k={k}, min_score={min_score}, dedupe={dedupe})")
+    
+    # Get model & searcher
+    model = get_model()
+    searcher = get_search()
+    
+    # One encode call + one FAISS search for all queries
+    batch_results = searcher.search_text_batch(
+        query_texts=queries,
+        embedding_model=model,
+        k=k,
+        min_score=min_score,
+        dedupe=dedupe
+    )
+    
+    output = f"# Batch Search: {len(queries)} queries\n\n"
+    if dedupe:
+        output += "Each chunk is listed once, under the query it matches best.\n\n"
+    
+    for query, results in zip(queries, batch_results):
+        output += f"# Search Results: {query}\n\n"
+        if not results:
+            output += f"No results found for: {query}\n\n---\n\n"
+            continue
+        
+        output += f"Found {len(results)} relevant chunks:\n\n"
+        for i, result in enumerate(results, 1):
+            output += format_result(i, result)
+    
+    return [TextContent(type="text", text=output)]
+
+
+def format_result(i: int, result: Dict) -> str:
+    """Format one search hit (shared by search_library and search_library_batch)."""
+    score = result["score"]
+    book_title = result.get("book_title", "Unknown")
+    book_author = result.get("book_author", "Unknown")
+    text = result["text"]
+    chunk_id = result["chunk_id"]
+    book_id = result.get("book_id") or result.get("book_hash") or ""
+
+    # Source metadata
+    source = result.get("source", {})
+    source_type = source.get("type", "unknown")
+
+    # Build reader deep-link
+    # Use first ~60 chars of chunk text as locator (urlencoded).
+    # Strip leading whitespace/newlines from preview.
+    preview = text.strip().split("\n")[0][:60].strip()
+    t_param = urllib.parse.quote(preview)
+
+    if source_type == "epub":
+        spine_idx = source.get("spine_index", "?")
+        href = source.get("href", "")
+        location = f"spine {spine_idx}, {href}"
+        href_param = urllib.parse.quote(href)
+        reader_url = (
+            f"https://8088.nonlinear.nyc/book/{book_id}"
+            f"#href={href_param}&t={t_param}"
+        ) if book_id and href else (
+            f"https://8088.nonlinear.nyc/book/{book_id}" if book_id else ""
+        )
+    elif source_type == "pdf":
+        page = source.get("page", "?")
+        location = f"page {page}"
+        reader_url = (
+            f"https://8088.nonlinear.nyc/book/{book_id}#p={page}"
+        ) if book_id else ""
+    else:
+        location = "unknown location"
+        reader_url = f"https://8088.nonlinear.nyc/book/{book_id}" if book_id else ""
+
+    output = f"## {i}. {book_title} [{score:.3f}]\n\n"
+    output += f"**Author:** {book_author}  \n"
+    output += f"**Location:** {location}  \n"
+    output += f"**Chunk ID:** `{chunk_id}`  \n"
+    if reader_url:
+        output += f"**Reader:** {reader_url}  \n"
+    output += "\n"
+    output += f"> {text[:300]}{'...' if len(text) > 300 else ''}\n\n"
+    output += "---\n\n"
+    return output
+
+
+def handle_get_chunk(args: dict) -> List[TextContent]:
     """
     Handle get_chunk tool call.
     
@@ -265,7 +433,38 @@ async def handle_get_chunk(args: dict) -> List[TextContent]:
             text=f"Chunk not found: {chunk_id}"
         )]
     
-    # Format output
+    return [TextContent(type="text", text=format_chunk(chunk_id, chunk))]
+
+
+def handle_get_chunks(args: dict) -> List[TextContent]:
+    """
+    Handle get_chunks tool call (batch get_chunk).
+    
+    Args:
+        args: {chunk_ids}
+    
+    Returns:
+        Full content for each chunk, in request order
+    """
+    chunk_ids = args.get("chunk_ids", [])
+    
+    logger.info(f"Get chunks: {len(chunk_ids)} ids")
+    
+    searcher = get_search()
+    chunks = searcher.get_chunks(chunk_ids)
+    
+    sections = []
+    for chunk_id, chunk in zip(chunk_ids, chunks):
+        if chunk:
+            sections.append(format_chunk(chunk_id, chunk))
+        else:
+            sections.append(f"# Chunk: {chunk_id}\n\nChunk not found: {chunk_id}\n")
+    
+    return [TextContent(type="text", text="\n---\n\n".join(sections))]
+
+
+def format_chunk(chunk_id: str, chunk: Dict) -> str:
+    """Format one chunk for get_chunk/get_chunks output."""
     output = f"# Chunk: {chunk_id}\n\n"
     output += f"**Book:** {chunk.get('book_title', 'Unknown')}  \n"
     output += f"**Text:**\n\n{chunk['text']}\n\n"
@@ -281,10 +480,10 @@ async def handle_get_chunk(args: dict) -> List[TextContent]:
         for p in paragraphs[:3]:  # Show first 3
             output += f"- idx={p.get('idx')}, element_id={p.get('element_id')}\n"
     
-    return [TextContent(type="text", text=output)]
+    return output
 
 
-async def handle_stats(args: dict) -> List[TextContent]:
+def handle_stats(args: dict) -> List[TextContent]:
     """
     Handle stats tool call.
     
@@ -300,17 +499,41 @@ async def handle_stats(args: dict) -> List[TextContent]:
     output += f"**Books:** {stats['total_books']:,}  \n"
     output += f"**Chunks:** {stats['total_chunks']:,}  \n"
     output += f"**Vectors:** {stats['total_vectors']:,}  \n"
+    output += f"**Dead vectors:** {stats['dead_vectors']:,} (deleted books, reclaim with `indexer_v6.py compact`)  \n"
     output += f"**Dimensions:** {stats['dimensions']}  \n"
-    output += f"**Index Type:** {stats['index_type']}\n\n"
+    output += f"**Index Type:** {stats['index_type']}  \n"
+    output += f"**Index generation:** {_generation}"
+    if _last_reload:
+        reloaded = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(_last_reload["time"]))
+        status = f"failed: {_last_reload['error']}" if _last_reload["error"] else "ok"
+        output += f" (last reload {reloaded}, {_last_reload['seconds']:.1f}s, {status})"
+    output += "\n\n"
     
     # File sizes
     faiss_size = FAISS_INDEX.stat().st_size / 1024 / 1024
-    meta_size = METADATA_JSON.stat().st_size / 1024 / 1024
+    meta_size = searcher.chunks.size_bytes() / 1024 / 1024
     
     output += f"**Storage:**  \n"
     output += f"- FAISS index: {faiss_size:.1f} MB  \n"
-    output += f"- Metadata: {meta_size:.1f} MB  \n"
-    output += f"- Total: {faiss_size + meta_size:.1f} MB\n"
+    output += f"- Chunk store: {meta_size:.1f} MB  \n"
+    output += f"- Total: {faiss_size + meta_size:.1f} MB\n\n"
+    
+    # Query embedding cache (shared by all search tools)
+    cache = query_cache.stats()
+    output += f"**Query embedding cache:**  \n"
+    output += f"- Entries: {cache['size']:,} / {cache['max_size']:,}  \n"
+    output += f"- Hits: {cache['hits']:,}  \n"
+    output += f"- Misses: {cache['misses']:,}  \n"
+    output += f"- Hit rate: {cache['hit_rate']:.0%}\n\n"
+    
+    # Tool executor (queue depth, timeouts)
+    executor = tool_executor.stats()
+    output += f"**Tool executor:**  \n"
+    output += f"- Workers: {executor['active']} busy / {executor['workers']}  \n"
+    output += f"- Queued: {executor['queued']} (max seen {executor['max_queued']}, limit {executor['max_pending']} pending)  \n"
+    output += f"- Completed: {executor['completed']:,} (failed {executor['failed']:,})  \n"
+    output += f"- Timed out: {executor['timed_out']:,}, rejected (busy): {executor['rejected']:,}  \n"
+    output += f"- Avg wait: {executor['avg_wait_ms']:.1f} ms, avg run: {executor['avg_run_ms']:.1f} ms\n"
     
     return [TextContent(type="text", text=output)]
 
@@ -319,31 +542,13 @@ async def main():
     """Run MCP server."""
     logger.info("Starting Librarian MCP v5 (FAISS-only)")
     
-    # T020: Setup signal handler for hot-reload
+    # T020: SIGHUP = reload FAISS index (loaded on the reload thread, then swapped)
     def reload_handler(signum, frame):
-        """Handle SIGHUP = reload FAISS index."""
-        logger.info("SIGHUP received, reloading FAISS index...")
-        global _searcher
-        with _searcher_lock:
-            old_searcher = _searcher
-            _searcher = None  # Clear cache
-            try:
-                # Reload from disk
-                _searcher = get_searcher(
-                    index_path=str(FAISS_INDEX),
-                    metadata_path=str(METADATA_JSON)
-                )
-                stats = _searcher.get_stats()
-                logger.info(
-                    f"✅ FAISS reloaded: {stats['total_chunks']:,} chunks"
-                )
-                # Free old searcher
-                del old_searcher
-            except Exception as e:
-                logger.error(f"❌ Reload failed: {e}")
-                # Restore old searcher on failure
-                _searcher = old_searcher
+        """Handle SIGHUP: only signals the reload thread (never blocks queries)."""
+        logger.info("SIGHUP received, reloading FAISS index in background")
+        request_reload()
     
+    threading.Thread(target=reload_loop, name="faiss-reload", daemon=True).start()
     signal.signal(signal.SIGHUP, reload_handler)
     logger.info("Hot-reload enabled (send SIGHUP to reload index)")
     
@@ -355,6 +560,13 @@ async def main():
         logger.error("Make sure FAISS index exists at /app/books/faiss.index")
         sys.exit(1)
     
+    # Warm the embedding model, then share it with indexer runs (watcher)
+    try:
+        warm_up()
+        serve_socket()
+    except Exception as e:
+        logger.warning(f"Embedding warm-up failed (will load on first query): {e}")
+    
     async with stdio_server() as (read_stream, write_stream):
         await app.run(read_stream, write_stream, app.create_initialization_options())
 
@@ -2,15 +2,19 @@
 """
 Migrate existing index to v6 format with file cache.
 
-One-time migration: metadata.json → .index_state.json
+One-time migration: metadata.json → index state store (.index_state.sqlite)
 """
 import json
 import os
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent))
+from index_state import IndexStateStore
+
 LIBRARY_ROOT = Path("/app/books")
 METADATA_PATH = LIBRARY_ROOT / "metadata.json"
-INDEX_STATE_PATH = LIBRARY_ROOT / ".index_state.json"
+INDEX_STATE_PATH = LIBRARY_ROOT / ".index_state.sqlite"
 
 print("🔄 Migrating to v6 index state...")
 
@@ -56,9 +60,11 @@ for book in books:
             "hash": book_id
         }
 
-# Save
-with open(INDEX_STATE_PATH, "w") as f:
-    json.dump(state, f, indent=2)
+# Save (replaces whatever the store held)
+store = IndexStateStore(INDEX_STATE_PATH)
+store.load()
+store.save(state)
+store.close()
 
 print(f"✅ Created {INDEX_STATE_PATH}")
 print(f"   {len(state['books'])} books")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Query Embedding Cache — shared in-process LRU for query-time encodes
+
+One bounded LRU (normalized text → float32 vector) behind every query-time
+model.encode: FAISSSearch.search_text, cluster_selection.build_query_embedding
+and search.search_library. Repeated queries and resent conversation history
+skip the model.
+
+Keys use the same normalization as the indexer's embedding cache
+(unicode NFC + collapsed whitespace). One embedding model per process
+(bge-small), so the model is not part of the key.
+
+Usage:
+    from query_cache import encode_cached, query_cache
+
+    vector = encode_cached(model, "what are design tokens")     # (384,)
+    vectors = encode_cached(model, ["msg 1", "msg 2"])          # (2, 384), misses in one batch
+    query_cache.stats()  # {"size", "max_size", "hits", "misses", "hit_rate"}
+"""
+import os
+import sys
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import List, Dict, Optional, Union
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+from embedding_cache import normalize_text
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))  # Entries (~1.5 KB each)
+
+
+class QueryEmbeddingCache:
+    """Thread-safe bounded LRU of query embeddings."""
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE):
+        """
+        Args:
+            max_size: Maximum number of cached texts (0 disables caching)
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Cached vector for `text` (a copy), or None. Counts a hit or miss."""
+        key = normalize_text(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return vector.copy()
+
+    def put(self, text: str, vector: np.ndarray):
+        """Store a vector, evicting the least recently used entries."""
+        if self.max_size <= 0:
+            return
+        vector = np.array(vector, dtype="float32")
+        vector.setflags(write=False)
+        key = normalize_text(text)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def encode(self, model, texts: List[str]) -> np.ndarray:
+        """
+        Embed `texts` through the cache (misses go to the model in one batch).
+
+        Repeated texts in one call (e.g. the query resent as the newest
+        history message) are encoded once.
+
+        Args:
+            model: Model with .encode() method
+            texts: Texts to embed
+
+        Returns:
+            float32 array, shape (len(texts), dim), row order = texts
+        """
+        vectors = [self.get(text) for text in texts]
+
+        # Misses grouped by normalized text: one model input per distinct text
+        missing = OrderedDict()
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(normalize_text(texts[i]), []).append(i)
+
+        if missing:
+            rows = [positions[0] for positions in missing.values()]
+            encoded = model.encode([texts[i] for i in rows], convert_to_numpy=True)
+            for positions, vector in zip(missing.values(), encoded):
+                self.put(texts[positions[0]], vector)
+                for i in positions:
+                    vectors[i] = np.asarray(vector, dtype="float32")
+
+        return np.stack(vectors).astype("float32", copy=False)
+
+    def stats(self) -> Dict:
+        """Counters for the stats tool."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Process-wide cache (shared by all query-time callers)
+query_cache = QueryEmbeddingCache(QUERY_CACHE_SIZE)
+
+
+def encode_cached(model, texts: Union[str, List[str]]) -> np.ndarray:
+    """
+    Cached model.encode for query-time text.
+
+    Args:
+        model: Model with .encode() method
+        texts: One text (→ 1-D vector) or a list (→ 2-D array)
+    """
+    if isinstance(texts, str):
+        return query_cache.encode(model, [texts])[0]
+    return query_cache.encode(model, list(texts))
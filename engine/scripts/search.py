@@ -15,31 +15,34 @@ Usage:
     )
 """
 import os
+import sys
 import json
+import threading
 from pathlib import Path
+from collections import OrderedDict
 from typing import List, Dict, Optional
 import numpy as np
 
-from sentence_transformers import SentenceTransformer
 import faiss
 
+sys.path.insert(0, str(Path(__file__).parent))
+from query_cache import encode_cached
+from ann_index import search_params
+from embedding_service import get_model
+
 # Paths
 LIBRARY_ROOT = Path(__file__).parent.parent.parent / "books"
-MODELS_DIR = Path(__file__).parent.parent / "models"
 
-# Embedding model (same as indexer)
-EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+TOPIC_CACHE_SIZE = int(os.getenv("TOPIC_CACHE_SIZE", "64"))  # Loaded topics kept in memory
 
-# Global embed model (lazy load)
-embed_model = None
+# Per-discipline cache: parsed index + book matrix + book-level FAISS index
+# (discipline → entry, replaced when .discipline-index.json changes)
+_discipline_cache = {}
+_discipline_lock = threading.Lock()
 
 
-def get_embed_model():
-    """Lazy load embedding model."""
-    global embed_model
-    if embed_model is None:
-        embed_model = SentenceTransformer(EMBEDDING_MODEL, cache_folder=str(MODELS_DIR))
-    return embed_model
+def discipline_index_path(discipline: str) -> Path:
+    return LIBRARY_ROOT / discipline / ".discipline-index.json"
 
 
 def load_discipline_index(discipline: str) -> Dict:
@@ -52,8 +55,7 @@ def load_discipline_index(discipline: str) -> Dict:
     Returns:
         Discipline index dict
     """
-    discipline_path = LIBRARY_ROOT / discipline
-    index_path = discipline_path / ".discipline-index.json"
+    index_path = discipline_index_path(discipline)
     
     if not index_path.exists():
         raise FileNotFoundError(f"Discipline index not found: {index_path}")
@@ -62,6 +64,74 @@ def load_discipline_index(discipline: str) -> Dict:
         return json.load(f)
 
 
+def get_discipline(discipline: str) -> Dict:
+    """
+    Cached discipline index with its book-level FAISS index.
+    
+    Parsed once and reused until .discipline-index.json changes
+    (mtime/size check per call, no JSON parsing on a hit).
+    
+    Args:
+        discipline: Discipline ID (e.g., "management_knowledge")
+    
+    Returns:
+        {
+            "index": {...},            # Parsed .discipline-index.json
+            "books": [...],
+            "book_ids": [...],         # Row i of the FAISS index = book_ids[i]
+            "row_books": int array,    # Book code per row (see book_mask())
+            "book_codes": {...},       # book_id → code
+            "faiss_index": IndexFlatL2 or None (no books)
+        }
+    """
+    index_path = discipline_index_path(discipline)
+    try:
+        stat = index_path.stat()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Discipline index not found: {index_path}")
+    version = (stat.st_mtime_ns, stat.st_size)
+    
+    entry = _discipline_cache.get(discipline)
+    if entry is not None and entry["version"] == version:
+        return entry
+    
+    with _discipline_lock:
+        entry = _discipline_cache.get(discipline)
+        if entry is not None and entry["version"] == version:
+            return entry  # Built by a concurrent query
+        
+        try:
+            index = load_discipline_index(discipline)
+        except json.JSONDecodeError as e:
+            if entry is None:
+                raise
+            # Mid-write by an older writer: keep serving the previous version
+            print(f"Warning: Failed to reload {index_path}: {e}")
+            return entry
+        books = index.get("books", [])
+        embeddings = index.get("embeddings", {})
+        
+        book_ids = [b["id"] for b in books]
+        faiss_index = None
+        if books:
+            book_embeddings = np.array([embeddings[bid] for bid in book_ids]).astype('float32')
+            faiss_index = faiss.IndexFlatL2(book_embeddings.shape[1])
+            faiss_index.add(book_embeddings)
+        
+        row_books, book_codes = book_codes_for(book_ids)
+        entry = {
+            "version": version,
+            "index": index,
+            "books": books,
+            "book_ids": book_ids,
+            "row_books": row_books,
+            "book_codes": book_codes,
+            "faiss_index": faiss_index
+        }
+        _discipline_cache[discipline] = entry
+        return entry
+
+
 def load_topic_chunks(topic_path: Path) -> tuple:
     """
     Load chunks and FAISS index for a topic.
@@ -88,6 +158,293 @@ def load_topic_chunks(topic_path: Path) -> tuple:
         return None, None
 
 
+def row_filter(mask: np.ndarray, faiss_index) -> tuple:
+    """
+    FAISS search parameters restricting a search to the rows set in `mask`.
+    
+    The allowed rows become an IDSelectorBitmap (one bit per row), so the
+    index returns the top-k among allowed rows directly instead of
+    over-fetching and dropping rows afterwards.
+    
+    Args:
+        mask: Boolean array, one entry per index row
+        faiss_index: Index to search (picks the parameter class: flat, IVF, HNSW)
+    
+    Returns:
+        Tuple of (search_params, allowed_row_count, bitmap).
+        Keep `bitmap` referenced until the search returns (FAISS reads it
+        through a raw pointer).
+    """
+    bitmap = np.packbits(mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    params = search_params(faiss_index, sel=selector)
+    return params, int(mask.sum()), bitmap
+
+
+def book_mask(row_books: np.ndarray, book_codes: Dict[str, int], allowed_book_ids: set) -> np.ndarray:
+    """
+    Row mask for a set of book ids.
+    
+    Args:
+        row_books: Book code of each index row (int array)
+        book_codes: book_id → code
+        allowed_book_ids: Book ids to keep
+    """
+    allowed_codes = [book_codes[book_id] for book_id in allowed_book_ids if book_id in book_codes]
+    return np.isin(row_books, allowed_codes)
+
+
+def book_codes_for(row_book_ids: List[str]) -> tuple:
+    """(row_books int array, book_id → code) for book_mask()."""
+    book_codes = {}
+    row_books = np.fromiter(
+        (book_codes.setdefault(book_id, len(book_codes)) for book_id in row_book_ids),
+        dtype=np.int32,
+        count=len(row_book_ids)
+    )
+    return row_books, book_codes
+
+
+def chunk_result(chunk: Dict, distance: float) -> Dict:
+    """Search result dict for a topic chunk (L2 distance → similarity)."""
+    similarity = 1 / (1 + distance)
+    
+    return {
+        "book_title": chunk.get("book_title", "Unknown"),
+        "book_author": chunk.get("book_author", "Unknown"),
+        "book_id": chunk["book_id"],
+        "similarity": float(similarity),
+        "text": chunk.get("chunk_full", ""),
+        "page": chunk.get("page"),
+        "chapter": chunk.get("chapter"),
+        "paragraph": chunk.get("paragraph"),
+        "cfi": None  # TODO: generate CFI from chapter + paragraph
+    }
+
+
+def _file_version(path: Path) -> Optional[tuple]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def find_topic_dirs(base_path: Path) -> List[Path]:
+    """
+    Recursively scan for topic directories (containing .chunks.json).
+    
+    Hidden directories are skipped; a topic directory is not searched
+    for nested topics.
+    """
+    topic_dirs = []
+    for item in sorted(base_path.iterdir()):
+        if item.name.startswith('.'):
+            continue
+        if item.is_dir():
+            # Check if this is a topic directory (has .chunks.json)
+            if (item / ".chunks.json").exists():
+                topic_dirs.append(item)
+            else:
+                # Recurse into subdirectories
+                topic_dirs.extend(find_topic_dirs(item))
+    return topic_dirs
+
+
+class TopicRegistry:
+    """
+    Process-wide registry of topic directories and their loaded indices.
+    
+    - Topic discovery runs once per discipline and again only when the
+      discipline's .discipline-index.json changes (or after invalidate()).
+    - Loaded (chunks, faiss_index) pairs live in an LRU keyed by topic path
+      and validated by the mtime/size of .chunks.json and .faiss.index,
+      so a reindexed topic is picked up on the next query.
+    - Per discipline, all topic indices are also merged into one index
+      (merged(), built from the LRU entries), so a query runs a single
+      FAISS search across topics.
+    - Thread-safe: concurrent queries share entries, and a topic is read
+      from disk by one thread while the others wait for it.
+    """
+    
+    def __init__(self, max_size: int = TOPIC_CACHE_SIZE):
+        """
+        Args:
+            max_size: Maximum number of loaded topics kept in memory
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._topics = {}              # discipline → (discipline index version, [topic paths])
+        self._entries = OrderedDict()  # topic path → (version, chunks, faiss_index)
+        self._load_locks = {}          # topic path → Lock (one disk load at a time per topic)
+        self._merged = {}              # discipline → merged index entry (see merged())
+        self._merged_lock = threading.Lock()
+        self._lock = threading.Lock()
+    
+    def topic_dirs(self, discipline: str) -> List[Path]:
+        """Topic directories of a discipline (discovered once per index version)."""
+        version = _file_version(discipline_index_path(discipline))
+        with self._lock:
+            cached = self._topics.get(discipline)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        
+        discipline_path = LIBRARY_ROOT / discipline
+        topic_dirs = find_topic_dirs(discipline_path) if discipline_path.is_dir() else []
+        
+        with self._lock:
+            self._topics[discipline] = (version, topic_dirs)
+        return topic_dirs
+    
+    def load(self, topic_path: Path) -> tuple:
+        """
+        Cached load_topic_chunks().
+        
+        Returns:
+            Tuple of (chunks_list, faiss_index) or (None, None) if not found
+        """
+        key = str(topic_path)
+        version = (
+            _file_version(topic_path / ".chunks.json"),
+            _file_version(topic_path / ".faiss.index")
+        )
+        if None in version:
+            return None, None
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == version:
+                    self.hits += 1
+                    return entry[1], entry[2]  # Loaded by a concurrent query
+                self.misses += 1
+            
+            chunks, faiss_index = load_topic_chunks(topic_path)
+            if chunks is None:
+                return None, None
+            
+            with self._lock:
+                self._entries[key] = (version, chunks, faiss_index)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._load_locks.pop(evicted, None)
+        
+        return chunks, faiss_index
+    
+    def merged(self, discipline: str) -> Optional[Dict]:
+        """
+        One FAISS index over all topics of a discipline.
+        
+        Topics are read through the per-topic LRU (load()), so when one
+        topic file changes the rebuild only reads that topic from disk.
+        
+        Returns:
+            {
+                "chunks": [...],           # Row i of the index = chunks[i]
+                "faiss_index": IndexFlat,  # Same metric as the topic indices
+                "row_books": int array,    # Book code per row (see book_mask())
+                "book_codes": {...}        # book_id → code
+            }
+            or None if the topics cannot be merged (no topics, different
+            dimensions/metrics, or index types without stored vectors)
+        """
+        topic_dirs = self.topic_dirs(discipline)
+        version = tuple(
+            (str(topic_path),
+             _file_version(topic_path / ".chunks.json"),
+             _file_version(topic_path / ".faiss.index"))
+            for topic_path in topic_dirs
+        )
+        
+        entry = self._merged.get(discipline)
+        if entry is not None and entry["version"] == version:
+            return entry["merged"]
+        
+        with self._merged_lock:
+            entry = self._merged.get(discipline)
+            if entry is not None and entry["version"] == version:
+                return entry["merged"]  # Built by a concurrent query
+            
+            merged = self._build_merged(topic_dirs)
+            self._merged[discipline] = {"version": version, "merged": merged}
+            return merged
+    
+    def _build_merged(self, topic_dirs: List[Path]) -> Optional[Dict]:
+        chunks = []
+        vectors = []
+        dimension = metric = None
+        
+        for topic_path in topic_dirs:
+            topic_chunks, topic_index = self.load(topic_path)
+            if topic_chunks is None:
+                continue
+            
+            if dimension is None:
+                dimension, metric = topic_index.d, topic_index.metric_type
+            elif (topic_index.d, topic_index.metric_type) != (dimension, metric):
+                return None
+            
+            try:
+                topic_vectors = topic_index.reconstruct_n(0, topic_index.ntotal)
+            except RuntimeError:
+                return None  # No stored vectors (e.g. IVF without direct map)
+            
+            # Rows past the end of .chunks.json are never returned (as in search_chunks_in_topic)
+            rows = min(len(topic_chunks), topic_index.ntotal)
+            chunks.extend(topic_chunks[:rows])
+            vectors.append(topic_vectors[:rows])
+        
+        if not chunks:
+            return None
+        
+        faiss_index = faiss.IndexFlat(dimension, metric)
+        faiss_index.add(np.ascontiguousarray(np.concatenate(vectors), dtype="float32"))
+        
+        row_books, book_codes = book_codes_for([chunk["book_id"] for chunk in chunks])
+        return {
+            "chunks": chunks,
+            "faiss_index": faiss_index,
+            "row_books": row_books,
+            "book_codes": book_codes
+        }
+    
+    def invalidate(self, discipline: Optional[str] = None):
+        """Forget discovered topics (one discipline or all) and loaded indices."""
+        with self._lock:
+            if discipline is None:
+                self._topics.clear()
+                self._merged.clear()
+            else:
+                self._topics.pop(discipline, None)
+                self._merged.pop(discipline, None)
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "disciplines": len(self._topics),
+                "loaded_topics": len(self._entries),
+                "merged_disciplines": len(self._merged),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+# Process-wide registry (shared by all queries)
+topic_registry = TopicRegistry(TOPIC_CACHE_SIZE)
+
+
 def search_chunks_in_topic(
     query_emb: np.ndarray,
     topic_path: Path,
@@ -106,50 +463,58 @@ def search_chunks_in_topic(
     Returns:
         List of chunk results with text, metadata, and scores
     """
-    chunks, faiss_index = load_topic_chunks(topic_path)
+    chunks, faiss_index = topic_registry.load(topic_path)
     
     if chunks is None or faiss_index is None:
         return []
     
-    # Search FAISS for top chunks
-    search_k = k * 5 if book_ids_filter else k
+    return search_chunks(query_emb, chunks, faiss_index, book_ids_filter, k)
+
+
+def search_chunks(
+    query_emb: np.ndarray,
+    chunks: List[Dict],
+    faiss_index,
+    book_ids_filter: Optional[set] = None,
+    k: int = 3,
+    row_mask: Optional[np.ndarray] = None
+) -> List[Dict]:
+    """
+    Top-k chunks of one index, restricted to book_ids_filter inside the search.
+    
+    Args:
+        query_emb: Query embedding vector
+        chunks: Chunk metadata (row i of faiss_index = chunks[i])
+        faiss_index: FAISS index over the chunks
+        book_ids_filter: Set of book_ids to filter (None = all)
+        k: Number of chunks to return
+        row_mask: Rows of book_ids_filter, if already known (see book_mask())
+    
+    Returns:
+        Up to k chunk results (exactly k if the allowed rows have that many)
+    """
+    rows = min(len(chunks), faiss_index.ntotal)
     query_reshaped = query_emb.reshape(1, -1).astype('float32')
-    distances, indices = faiss_index.search(query_reshaped, min(search_k, len(chunks)))
     
-    # Collect results
-    results = []
-    for i, idx in enumerate(indices[0]):
-        if idx == -1 or idx >= len(chunks):
-            continue
-        
-        chunk = chunks[idx]
-        
-        # Filter by book_id if specified
-        if book_ids_filter and chunk["book_id"] not in book_ids_filter:
-            continue
-        
-        distance = distances[0][i]
-        similarity = 1 / (1 + distance)
-        
-        # Build result
-        result = {
-            "book_title": chunk.get("book_title", "Unknown"),
-            "book_author": chunk.get("book_author", "Unknown"),
-            "book_id": chunk["book_id"],
-            "similarity": float(similarity),
-            "text": chunk.get("chunk_full", ""),
-            "page": chunk.get("page"),
-            "chapter": chunk.get("chapter"),
-            "paragraph": chunk.get("paragraph"),
-            "cfi": None  # TODO: generate CFI from chapter + paragraph
-        }
-        
-        results.append(result)
-        
-        if len(results) >= k:
-            break
+    if book_ids_filter:
+        if row_mask is None:
+            row_mask = np.zeros(faiss_index.ntotal, dtype=bool)
+            row_mask[:rows] = [chunk["book_id"] in book_ids_filter for chunk in chunks[:rows]]
+        params, allowed_rows, bitmap = row_filter(row_mask, faiss_index)
+        if allowed_rows == 0:
+            return []
+        distances, indices = faiss_index.search(query_reshaped, min(k, allowed_rows), params=params)
+    else:
+        if rows == 0:
+            return []
+        distances, indices = faiss_index.search(query_reshaped, min(k, rows))
     
-    return results
+    # Collect results
+    return [
+        chunk_result(chunks[idx], distances[0][i])
+        for i, idx in enumerate(indices[0])
+        if 0 <= idx < rows
+    ]
 
 
 def search_library(
@@ -176,12 +541,11 @@ def search_library(
     Returns:
         List of result dicts with book_title, similarity, text, page, cfi, etc.
     """
-    # 1. Load discipline index
-    index = load_discipline_index(discipline)
+    # 1. Load discipline index (cached, with its book-level FAISS index)
+    cached = get_discipline(discipline)
     
-    books = index.get("books", [])
-    embeddings = index.get("embeddings", {})
-    clusters_metadata = index.get("clusters", [])
+    books = cached["books"]
+    clusters_metadata = cached["index"].get("clusters", [])
     
     if not books:
         return []
@@ -201,74 +565,53 @@ def search_library(
         # No cluster filtering: all books allowed
         allowed_book_ids = None
     
-    # 3. Generate query embedding
-    model = get_embed_model()
-    query_emb = model.encode(query, convert_to_numpy=True)
-    
-    # 4. Build FAISS index ONCE (all books in discipline)
-    # TODO: Cache this index (rebuild only when discipline changes)
-    book_ids = [b["id"] for b in books]
-    book_embeddings = np.array([embeddings[bid] for bid in book_ids]).astype('float32')
+    # 3. Generate query embedding (shared query cache: usually a hit after cluster selection)
+    query_emb = encode_cached(get_model(), query)
     
-    dimension = book_embeddings.shape[1]
-    faiss_index = faiss.IndexFlatL2(dimension)
-    faiss_index.add(book_embeddings)
+    # 4. Book-level FAISS index (built once per discipline version)
+    faiss_index = cached["faiss_index"]
     
-    # 5. Book-level search (find relevant books)
-    search_k = min(10, len(books))  # Top 10 books for chunk search
+    # 5. Book-level search (find relevant books, cluster filter inside the search)
     query_emb_reshaped = query_emb.reshape(1, -1).astype('float32')
-    distances, indices = faiss_index.search(query_emb_reshaped, search_k)
+    if allowed_book_ids:
+        mask = book_mask(cached["row_books"], cached["book_codes"], allowed_book_ids)
+        params, allowed_books, bitmap = row_filter(mask, faiss_index)
+        search_k = min(10, allowed_books)  # Top 10 allowed books for chunk search
+        if search_k == 0:
+            return []
+        distances, indices = faiss_index.search(query_emb_reshaped, search_k, params=params)
+    else:
+        search_k = min(10, len(books))  # Top 10 books for chunk search
+        distances, indices = faiss_index.search(query_emb_reshaped, search_k)
     
-    # 6. Collect relevant book_ids (with cluster filtering)
-    relevant_book_ids = set()
-    for idx in indices[0]:
-        if idx == -1:
-            continue
-        
-        book = books[idx]
-        book_id = book["id"]
-        
-        # Filter by cluster
-        if allowed_book_ids and book_id not in allowed_book_ids:
-            continue
-        
-        relevant_book_ids.add(book_id)
+    # 6. Collect relevant book_ids
+    relevant_book_ids = {books[idx]["id"] for idx in indices[0] if idx != -1}
     
     if not relevant_book_ids:
         return []
     
-    # 7. Chunk-level search across all topics in discipline
-    # Scan for topic directories and search chunks
-    all_chunk_results = []
-    discipline_path = LIBRARY_ROOT / discipline
-    
-    # Recursively scan for topic directories (containing .chunks.json)
-    def find_topic_dirs(base_path: Path) -> List[Path]:
-        topic_dirs = []
-        for item in base_path.iterdir():
-            if item.name.startswith('.'):
-                continue
-            if item.is_dir():
-                # Check if this is a topic directory (has .chunks.json)
-                if (item / ".chunks.json").exists():
-                    topic_dirs.append(item)
-                else:
-                    # Recurse into subdirectories
-                    topic_dirs.extend(find_topic_dirs(item))
-        return topic_dirs
-    
-    topic_dirs = find_topic_dirs(discipline_path)
-    
-    # Search chunks in each topic directory
-    for topic_path in topic_dirs:
-        chunk_results = search_chunks_in_topic(
+    # 7. Chunk-level search across all topics in discipline: one search over
+    # the merged topic index, restricted to the relevant books
+    merged = topic_registry.merged(discipline)
+    if merged is not None:
+        all_chunk_results = search_chunks(
             query_emb=query_emb,
-            topic_path=topic_path,
+            chunks=merged["chunks"],
+            faiss_index=merged["faiss_index"],
             book_ids_filter=relevant_book_ids,
-            k=k * 2  # Get more chunks, will deduplicate/sort later
+            k=k,
+            row_mask=book_mask(merged["row_books"], merged["book_codes"], relevant_book_ids)
         )
-        
-        all_chunk_results.extend(chunk_results)
+    else:
+        # Topics that cannot be merged: search each topic and merge here
+        all_chunk_results = []
+        for topic_path in topic_registry.topic_dirs(discipline):
+            all_chunk_results.extend(search_chunks_in_topic(
+                query_emb=query_emb,
+                topic_path=topic_path,
+                book_ids_filter=relevant_book_ids,
+                k=k
+            ))
     
     # 8. Sort by similarity and return top k
     all_chunk_results.sort(key=lambda x: x["similarity"], reverse=True)
@@ -285,10 +628,6 @@ def search_library(
             book = books[idx]
             book_id = book["id"]
             
-            # Filter by cluster
-            if allowed_book_ids and book_id not in allowed_book_ids:
-                continue
-            
             distance = distances[0][indices[0].tolist().index(idx)]
             similarity = 1 / (1 + distance)
             
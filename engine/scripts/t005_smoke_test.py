@@ -67,7 +67,7 @@ def run_smoke_test():
     print("🔧 Initializing FAISS smoke test...")
     
     # Load FAISS
-    faiss = FAISSSearch("/app/books/faiss.index", "/app/books/metadata.json")
+    faiss = FAISSSearch("/app/books/faiss.index", "/app/books/chunks")
     model = SentenceTransformer("BAAI/bge-small-en-v1.5")
     
     print("✅ FAISS loaded\n")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+T025: Checkpoint crash recovery
+
+Simulates an indexing run killed after some checkpoints (chunk store
+segments + .vec files committed, faiss.index not written yet).
+
+Validates:
+- FAISSSearch loads in that state, serving the rows faiss.index covers
+- recover_interrupted_run restores the missing vectors from the .vec files
+- A run with nothing to repair doesn't load the FAISS index
+
+Usage:
+    python -m pytest t025_checkpoint_recovery_test.py
+"""
+import numpy as np
+import pytest
+
+import indexer_v6
+from chunk_store import ChunkStore
+from faiss_search import FAISSSearch
+
+DIM = 8
+CHUNKS_PER_BOOK = 3
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """Point indexer_v6 at an empty library in tmp_path."""
+    paths = {
+        "LIBRARY_ROOT": tmp_path,
+        "FAISS_INDEX_PATH": tmp_path / "faiss.index",
+        "CHUNK_STORE_DIR": tmp_path / "chunks",
+        "INDEX_STATE_PATH": tmp_path / ".index_state.sqlite",
+        "LEGACY_STATE_PATH": tmp_path / ".index_state.json",
+        "COMPACT_INDEX_PATH": tmp_path / "faiss.index.compact",
+        "COMPACTION_MARKER_PATH": tmp_path / ".compaction.json",
+    }
+    for name, path in paths.items():
+        monkeypatch.setattr(indexer_v6, name, path)
+    monkeypatch.setattr(indexer_v6, "EMBEDDING_DIM", DIM)
+    monkeypatch.setattr(indexer_v6, "state_store", None)
+    return tmp_path
+
+
+def run_checkpoint(index, state, first_book: int, books: int = 2):
+    """One checkpoint of `books` new books (random embeddings)."""
+    rng = np.random.default_rng(first_book)
+    chunks, embeddings = [], []
+    for book in range(first_book, first_book + books):
+        book_hash = f"book{book}"
+        start = state["total_chunks"] + len(chunks)
+        state["books"][book_hash] = {
+            "path": f"/library/{book_hash}.pdf",
+            "indexed_at": 0,
+            "chunk_range": [start, start + CHUNKS_PER_BOOK],
+            "chunk_count": CHUNKS_PER_BOOK
+        }
+        chunks += [
+            {"chunk_id": f"ch_{book}_{i}", "book_hash": book_hash, "text": f"{book}/{i}"}
+            for i in range(CHUNKS_PER_BOOK)
+        ]
+        embeddings.append(rng.random((CHUNKS_PER_BOOK, DIM)).astype("float32"))
+    return indexer_v6.checkpoint(index, chunks, embeddings, state)
+
+
+def reopen_state():
+    indexer_v6.state_store = None
+    return indexer_v6.load_index_state()
+
+
+def test_searcher_loads_after_mid_run_crash(library):
+    # Run 1 completes: 6 rows in faiss.index
+    state = indexer_v6.load_index_state()
+    index = run_checkpoint(None, state, 0)
+    indexer_v6.save_faiss_index(index, ChunkStore(indexer_v6.CHUNK_STORE_DIR), state)
+
+    # Run 2 is killed after two checkpoints: store has 18 rows, FAISS 6
+    state = reopen_state()
+    index = run_checkpoint(None, state, 2)
+    run_checkpoint(index, state, 4)
+
+    searcher = FAISSSearch(str(indexer_v6.FAISS_INDEX_PATH), str(indexer_v6.CHUNK_STORE_DIR))
+    assert searcher.index.ntotal == len(searcher.chunks) == 6
+    assert searcher.chunks.get_by_id("ch_1_2") is not None
+    assert searcher.chunks.get_by_id("ch_2_0") is None
+
+    # Next run catches FAISS up from the .vec files
+    state = reopen_state()
+    store = ChunkStore(indexer_v6.CHUNK_STORE_DIR)
+    index = indexer_v6.recover_interrupted_run(state, store)
+    assert index.ntotal == len(store) == 18
+    assert not list((library / "chunks").glob("*.vec"))
+
+    searcher = FAISSSearch(str(indexer_v6.FAISS_INDEX_PATH), str(indexer_v6.CHUNK_STORE_DIR))
+    assert searcher.index.ntotal == len(searcher.chunks) == 18
+
+
+def test_recovery_without_vectors_aborts(library):
+    state = indexer_v6.load_index_state()
+    index = run_checkpoint(None, state, 0)
+    indexer_v6.save_faiss_index(index, ChunkStore(indexer_v6.CHUNK_STORE_DIR), state)
+    run_checkpoint(index, reopen_state(), 2)
+    ChunkStore(indexer_v6.CHUNK_STORE_DIR).drop_vectors()
+
+    with pytest.raises(ValueError):
+        indexer_v6.recover_interrupted_run(reopen_state(), ChunkStore(indexer_v6.CHUNK_STORE_DIR))
+
+
+def test_clean_state_skips_index_load(library, monkeypatch):
+    state = indexer_v6.load_index_state()
+    index = run_checkpoint(None, state, 0)
+    indexer_v6.save_faiss_index(index, ChunkStore(indexer_v6.CHUNK_STORE_DIR), state)
+
+    def fail():
+        raise AssertionError("FAISS index loaded on a clean run")
+    monkeypatch.setattr(indexer_v6, "load_faiss_index", fail)
+
+    assert indexer_v6.recover_interrupted_run(reopen_state(), ChunkStore(indexer_v6.CHUNK_STORE_DIR)) is None
@@ -5,7 +5,7 @@ Text Extraction Layer — EPUB/PDF → Clean Text
 Extracts full text from ebooks for embedding generation.
 
 Supports:
-- EPUB (via ebooklib + BeautifulSoup)
+- EPUB (via ebooklib + BeautifulSoup; paragraphs streamed via zipfile + lxml)
 - PDF (via PyMuPDF/fitz)
 
 Usage:
@@ -15,8 +15,11 @@ Usage:
     chunks = chunk_text(text, size=800, overlap=100)
 """
 import os
+import zipfile
+import posixpath
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from urllib.parse import unquote
+from typing import List, Optional, Dict, Any, Iterable, Iterator
 
 # EPUB extraction
 try:
@@ -27,6 +30,24 @@ try:
 except ImportError:
     HAS_EPUB = False
 
+# Streaming EPUB paragraphs (lxml ships with ebooklib)
+try:
+    from lxml import etree
+    _XML_PARSER = etree.XMLParser(recover=True, resolve_entities=False)
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# ⚠️ This selector MUST match reader's querySelector!
+# EPUBs use: div, span, li, headings
+PARAGRAPH_TAGS = frozenset(["p", "li", "blockquote", "h1", "h2", "h3"])
+SKIPPED_TAGS = frozenset(["script", "style"])             # Removed before extraction
+HIDDEN_TEXT_TAGS = frozenset(["rt", "rp", "template"])    # BeautifulSoup get_text() skips these strings
+
+CONTAINER_NS = "urn:oasis:names:tc:opendocument:xmlns:container"
+OPF_NS = "http://www.idpf.org/2007/opf"
+EPUB_READ_BLOCK = 64 * 1024  # Bytes fed to the incremental parser per step
+
 # PDF extraction
 try:
     import fitz  # PyMuPDF
@@ -87,54 +108,211 @@ def extract_epub_paragraphs(path: Path) -> List[Dict[str, Any]]:
         ...
     ]
     
+    List wrapper around iter_epub_paragraphs() (prefer the generator for
+    large books).
+    
     Args:
         path: Path to EPUB file
     
     Returns:
         List of paragraph dicts with location metadata
     """
-    if not HAS_EPUB:
-        raise ImportError("ebooklib not installed. Install with: pip install ebooklib beautifulsoup4")
+    return list(iter_epub_paragraphs(path))
+
+
+def iter_epub_paragraphs(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Stream paragraphs from EPUB (same dicts as extract_epub_paragraphs).
     
-    book = epub.read_epub(str(path))
-    spine = [item for item in book.get_items_of_type(ITEM_DOCUMENT)]
+    Bounded memory: documents are read one at a time from the zip (images
+    and other items are never loaded) and fed to lxml's incremental HTML
+    parser; each paragraph subtree is freed as soon as it has been yielded.
     
-    all_paragraphs = []
+    Output is identical to the previous ebooklib + BeautifulSoup extractor:
+    same documents in the same order (manifest XHTML items), same parse
+    (libxml2 HTML parser, as ebooklib uses), same selector and
+    get_text(strip=True) semantics.
+    
+    Args:
+        path: Path to EPUB file
+    
+    Yields:
+        Paragraph dicts with location metadata
+    """
+    if not HAS_LXML:
+        raise ImportError("lxml not installed. Install with: pip install lxml")
     
-    for spine_index, item in enumerate(spine):
-        href = item.get_name()  # e.g., "chapter1.xhtml"
-        content = item.get_content()
-        soup = BeautifulSoup(content, "html.parser")
+    with zipfile.ZipFile(str(path)) as zf:
+        for spine_index, (href, member) in enumerate(_epub_documents(zf)):
+            if member is None:  # Generated cover page (image only)
+                continue
+            
+            with zf.open(member) as stream:
+                for paragraph_idx, text, element_id in _iter_document_paragraphs(stream):
+                    yield {
+                        "text": text,
+                        "spine_index": spine_index,
+                        "href": href,
+                        "paragraph_idx": paragraph_idx,
+                        "element_id": element_id  # may be None
+                    }
+
+
+def _epub_documents(zf: zipfile.ZipFile) -> List[tuple]:
+    """
+    XHTML documents of an EPUB as (href, zip member), in manifest order.
+    
+    Mirrors ebooklib's reader (what get_items_of_type(ITEM_DOCUMENT)
+    returned): every manifest item must exist in the zip, nav documents
+    count, cover pages ("cover" property) are replaced by a generated
+    image page named cover.xhtml (member None).
+    """
+    container = etree.fromstring(zf.read("META-INF/container.xml"), _XML_PARSER)
+    opf_file = None
+    for root_file in container.iterfind(f".//{{{CONTAINER_NS}}}rootfile[@media-type]"):
+        if root_file.get("media-type") == "application/oebps-package+xml":
+            opf_file = root_file.get("full-path")
+    
+    opf_dir = posixpath.dirname(opf_file)
+    opf = etree.fromstring(zf.read(posixpath.normpath(opf_file)), _XML_PARSER)
+    
+    documents = []
+    for item in opf.find(f"{{{OPF_NS}}}manifest"):
+        if item.tag != f"{{{OPF_NS}}}item":
+            continue
+        
+        href = item.get("href")
+        is_document = item.get("media-type") == "application/xhtml+xml"
+        properties = (item.get("properties") or "").split(" ")
         
-        # Remove script/style tags
-        for script in soup(["script", "style"]):
-            script.decompose()
+        # ebooklib reads nav documents by their raw (still quoted) href
+        is_nav = is_document and "nav" in properties
+        member = posixpath.normpath(posixpath.join(opf_dir, href if is_nav else unquote(href)))
+        zf.getinfo(member)  # KeyError for missing items (ebooklib loaded all of them)
         
-        # 🔑 Extract readable elements (NOT just <p>)
-        # EPUBs use: div, span, li, headings
-        # ⚠️ This selector MUST match reader's querySelector!
-        elements = soup.find_all([
-            "p", "li", "blockquote",
-            "h1", "h2", "h3"
-        ])
+        if not is_document:
+            continue
+        if is_nav:
+            documents.append((unquote(href), member))
+        elif "cover" in properties:
+            documents.append(("cover.xhtml", None))
+        else:
+            documents.append((unquote(href), member))
+    
+    return documents
+
+
+def _iter_document_paragraphs(stream) -> Iterator[tuple]:
+    """
+    Incrementally parse one XHTML document.
+    
+    Yields:
+        (paragraph_idx, text, element_id) for each non-empty paragraph;
+        paragraph_idx counts every matched element, like find_all() did
+    """
+    parser = etree.HTMLPullParser(events=("start", "end"), encoding="utf-8")
+    paragraph_idx = 0
+    open_paragraphs = 0  # Matched elements currently open (nesting)
+    
+    while True:
+        block = stream.read(EPUB_READ_BLOCK)
+        try:
+            if block:
+                parser.feed(block)
+            else:
+                parser.close()
+        except etree.LxmlError:
+            return  # Unparseable (e.g. empty) document: no paragraphs, as before
         
-        for paragraph_idx, el in enumerate(elements):
-            text = el.get_text(strip=True)
-            if not text:  # Skip empty elements
+        for event, el in parser.read_events():
+            if el.tag not in PARAGRAPH_TAGS:
+                continue
+            if event == "start":
+                open_paragraphs += 1
                 continue
             
-            # Capture element ID if exists (improves navigation)
-            element_id = el.get("id")
+            open_paragraphs -= 1
+            if open_paragraphs:
+                continue  # Nested: handled with its outermost paragraph
             
-            all_paragraphs.append({
-                "text": text,
-                "spine_index": spine_index,
-                "href": href,
-                "paragraph_idx": paragraph_idx,
-                "element_id": element_id  # may be None
-            })
+            # Outermost paragraph complete: emit it + nested ones (document order)
+            if _in_body(el):
+                hidden = any(a.tag in HIDDEN_TEXT_TAGS for a in el.iterancestors())
+                for text, element_id in _paragraph_texts(el, hidden):
+                    if text:
+                        yield paragraph_idx, text, element_id
+                    paragraph_idx += 1
+            
+            # Free the subtree + everything before it
+            el.clear(keep_tail=True)
+            parent = el.getparent()
+            while el.getprevious() is not None:
+                del parent[0]
+        
+        if not block:
+            return
+
+
+def _in_body(el) -> bool:
+    """True if el is inside the document's <body> (ebooklib kept only body content)."""
+    ancestors = list(el.iterancestors())
+    if len(ancestors) < 2 or ancestors[-2].tag != "body":
+        return False
+    return ancestors[-1].find("body") is ancestors[-2]
+
+
+def _paragraph_texts(root, hidden: bool) -> List[tuple]:
+    """
+    Text of `root` and of every paragraph element nested in it (preorder).
     
-    return all_paragraphs
+    Same as BeautifulSoup get_text(strip=True) after script/style removal:
+    stripped text nodes joined with "", comments/PIs skipped, text inside
+    rt/rp/template ignored.
+    
+    Returns:
+        [(text, element_id), ...]
+    """
+    strings = []
+    results = []   # [text or None, element_id] in preorder
+    open_stack = []  # (results index, strings index) of open paragraphs
+    hidden_depth = 1 if hidden else 0
+    
+    def add(text):
+        if text and not hidden_depth:
+            text = text.strip()
+            if text:
+                strings.append(text)
+    
+    stack = [(root, False)]
+    while stack:
+        node, leaving = stack.pop()
+        
+        if leaving:
+            if node.tag in PARAGRAPH_TAGS:
+                result_idx, string_idx = open_stack.pop()
+                results[result_idx][0] = "".join(strings[string_idx:])
+            if node.tag in HIDDEN_TEXT_TAGS:
+                hidden_depth -= 1
+            if node is not root:
+                add(node.tail)
+            continue
+        
+        if not isinstance(node.tag, str) or node.tag in SKIPPED_TAGS:
+            # Comment / PI / removed element: only its tail is text
+            add(node.tail)
+            continue
+        
+        if node.tag in HIDDEN_TEXT_TAGS:
+            hidden_depth += 1
+        if node.tag in PARAGRAPH_TAGS:
+            open_stack.append((len(results), len(strings)))
+            results.append([None, node.get("id")])
+        
+        add(node.text)
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(node))
+    
+    return [tuple(result) for result in results]
 
 
 def extract_pdf(path: Path) -> str:
@@ -277,7 +455,7 @@ def chunk_text(text: str, size: int = 800, overlap: int = 100) -> List[str]:
     return chunks
 
 
-def chunk_paragraphs(paragraphs: List[Dict[str, Any]], max_chars: int = 1024) -> List[Dict[str, Any]]:
+def chunk_paragraphs(paragraphs: Iterable[Dict[str, Any]], max_chars: int = 1024) -> List[Dict[str, Any]]:
     """
     Group paragraphs into chunks (~1024 chars).
     
@@ -297,19 +475,13 @@ def chunk_paragraphs(paragraphs: List[Dict[str, Any]], max_chars: int = 1024) ->
     }
     
     Args:
-        paragraphs: List of paragraph dicts from extract_epub_paragraphs() or extract_pdf_paragraphs()
+        paragraphs: Paragraph dicts (list or generator) from extract_epub_paragraphs(),
+                    iter_epub_paragraphs() or extract_pdf_paragraphs()
         max_chars: Target chunk size (soft limit)
     
     Returns:
         List of chunk dicts
     """
-    if not paragraphs:
-        return []
-    
-    # Determine source type from first paragraph
-    first_para = paragraphs[0]
-    is_epub = "spine_index" in first_para
-    
     chunks = []
     current_chunk = {
         "text": "",
@@ -318,6 +490,9 @@ def chunk_paragraphs(paragraphs: List[Dict[str, Any]], max_chars: int = 1024) ->
     }
     
     for para in paragraphs:
+        # Source type (EPUB paragraphs carry a spine position)
+        is_epub = "spine_index" in para
+        
         # Would adding this paragraph exceed limit?
         if current_chunk["text"] and len(current_chunk["text"]) + len(para["text"]) > max_chars:
             # Save current chunk (if not empty)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tool Executor — bounded worker pool for MCP tool handlers
+
+MCP handlers are async, but their work (model inference, FAISS search,
+chunk reads, JSON loading) is blocking CPU/disk work. Running it on the
+event loop lets one slow query stall every other request, stats included.
+
+Handlers run their blocking part through a shared executor instead:
+
+    from tool_executor import tool_executor
+
+    results = await tool_executor.run(searcher.search_text, query, k=10)
+
+- Bounded: TOOL_WORKERS threads (FAISS and torch release the GIL, and
+  threads share the one loaded model/index), at most TOOL_MAX_PENDING
+  requests queued or running; beyond that requests are rejected
+  immediately instead of piling up.
+- Per-request timeout (TOOL_TIMEOUT seconds, or per call). A request that
+  times out while still queued never starts; one already running
+  finishes in the background, its result discarded.
+- stats(): queue depth, active workers and latency counters for the
+  stats tool.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "4"))
+TOOL_MAX_PENDING = int(os.getenv("TOOL_MAX_PENDING", "32"))  # Queued + running
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "60"))        # Seconds per request
+
+logger = logging.getLogger("librarian-executor")
+
+
+class ToolBusyError(RuntimeError):
+    """Too many requests queued; the caller should retry later."""
+
+
+class ToolExecutor:
+    """Bounded thread pool with timeouts and queue metrics."""
+
+    def __init__(
+        self,
+        workers: int = TOOL_WORKERS,
+        max_pending: int = TOOL_MAX_PENDING,
+        timeout: float = TOOL_TIMEOUT
+    ):
+        """
+        Args:
+            workers: Worker threads (requests running in parallel)
+            max_pending: Maximum requests queued or running
+            timeout: Default per-request timeout in seconds (0 = none)
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tool")
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.queued = 0
+        self.active = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.rejected = 0
+        self.total_wait = 0.0  # Seconds spent queued (started requests)
+        self.total_run = 0.0   # Seconds spent running (finished requests)
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """
+        Run func(*args, **kwargs) on the pool and await its result.
+
+        Args:
+            func: Blocking callable
+            timeout: Seconds before giving up (default: self.timeout, 0 = none)
+
+        Returns:
+            func's return value
+
+        Raises:
+            ToolBusyError: Too many requests pending
+            TimeoutError: No result within the timeout
+        """
+        with self._lock:
+            if self.queued + self.active >= self.max_pending:
+                self.rejected += 1
+                raise ToolBusyError(
+                    f"Server busy ({self.queued} queued, {self.active} running), retry shortly"
+                )
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+        submitted = time.perf_counter()
+        state = {"started": False}
+
+        def call():
+            started = time.perf_counter()
+            with self._lock:
+                state["started"] = True
+                self.queued -= 1
+                self.active += 1
+                self.total_wait += started - submitted
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.total_run += time.perf_counter() - started
+            with self._lock:
+                self.completed += 1
+            return result
+
+        future = self._pool.submit(call)
+        timeout = self.timeout if timeout is None else timeout
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or None)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            name = getattr(func, "__name__", "tool")
+            logger.warning(f"{name} timed out after {timeout:g}s")
+            raise TimeoutError(f"Request timed out after {timeout:g}s")
+        finally:
+            # Timed out/cancelled while still queued → never runs
+            # (already running → finishes, result discarded)
+            if future.cancel():
+                with self._lock:
+                    if not state["started"]:
+                        self.queued -= 1
+
+    def stats(self) -> Dict:
+        """Counters for the stats tool."""
+        with self._lock:
+            started = self.completed + self.failed + self.active
+            finished = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "queued": self.queued,
+                "active": self.active,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timed_out": self.timed_out,
+                "rejected": self.rejected,
+                "avg_wait_ms": 1000 * self.total_wait / started if started else 0.0,
+                "avg_run_ms": 1000 * self.total_run / finished if finished else 0.0
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Process-wide executor (shared by all tool handlers)
+tool_executor = ToolExecutor()
@@ -15,26 +15,27 @@ from fastapi import FastAPI, HTTPException
 from fastapi.responses import FileResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-import json
 import os
+import sys
 
 app = FastAPI(title="Librarian Reader")
 
 BOOKS_DIR = Path("/app/books")
 STATIC_DIR = Path("/app/reader/static")
-INDEX_STATE_PATH = BOOKS_DIR / ".index_state.json"
+INDEX_STATE_PATH = BOOKS_DIR / ".index_state.sqlite"
+LEGACY_STATE_PATH = BOOKS_DIR / ".index_state.json"
+
+# Index state store (shared with the indexer)
+sys.path.insert(0, str(Path(__file__).parent.parent / "engine" / "scripts"))
+from index_state import read_books
 
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
 
 def load_books():
-    """Read canonical .index_state.json → list of {id, title, author, path}."""
-    if not INDEX_STATE_PATH.exists():
-        return []
-    with open(INDEX_STATE_PATH) as f:
-        state = json.load(f)
+    """Read canonical index state → list of {id, title, author, path}."""
     books = []
-    for book_hash, book in state.get("books", {}).items():
+    for book_hash, book in read_books(INDEX_STATE_PATH, LEGACY_STATE_PATH).items():
         books.append({
             "id": book_hash,
             "title": book.get("title") or Path(book["path"]).stem,